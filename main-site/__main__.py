@@ -6,21 +6,26 @@ from solstice import *
 ssg = SiteGenerator(output_path="../dist/main-site")
 
 
-def build_blog(ssg: SiteGenerator) -> list[dict]:
-	posts = []
+def post_listing(entries: list[ContentEntry]) -> list[dict]:
+	"""Frontmatter of the given posts, as shown in post lists, leaving out hidden posts."""
+	return [
+		entry.meta | {"url": entry.url} for entry in entries if not entry.meta.get("hidden", False)
+	]
+
+
+def build_blog(ssg: SiteGenerator) -> ContentIndex:
+	pages = []
 
 	# TODO: this will detect files that collide in main-site but not others
 	# currently all the barcodes are in main-site so this is fine but once we make projects.runners.sh or zine.runners.sh this will need to be changed
 	barcode_set = {}
 
-	for dirname, file, name, _ in recurse_files("blog", [".md"]):
-		src_path = path.join(dirname, file)
-		dist_path = path.join(dirname, name + ".html")
-
-		pg = MarkdownPage(ssg, "blog.jinja", src_path, dist_path)
+	# only the frontmatter is read here; the posts themselves are converted by build_pages, in parallel
+	posts = ContentIndex(ssg, "blog")
 
-		if not pg.meta.get("hidden", False):
-			posts.append(pg.meta | {"url": "/" + dist_path.removesuffix(".html")})
+	for post in posts:
+		src_path = post.source_path
+		pg = MarkdownPage(ssg, "blog.jinja", src_path, post.output_path)
 
 		barcode = pg.meta.get("barcode")
 
@@ -37,10 +42,11 @@ def build_blog(ssg: SiteGenerator) -> list[dict]:
 
 		pg.set_params(funbar=funbar.html_from_ean8(barcode))
 
-		pg.build()
+		pages.append(pg)
 
-	posts.sort(key=lambda x: x["date"], reverse=True)
-	ssg.page("blog-overview.jinja", "blog/index.html", posts=posts)
+	ssg.build_pages(pages)
+
+	ssg.page("blog-overview.jinja", "blog/index.html", posts=post_listing(posts.by_date()))
 	return posts
 
 
@@ -52,15 +58,16 @@ social_link_formats = {
 }
 
 social_link_icons = {
-	"github": "icon/github.svg",
-	"mastodon": "icon/mastodon.svg",
-	"bsky": "icon/bsky.svg",
-	"website": "icon/globe.svg",
+	"github": "github",
+	"mastodon": "mastodon",
+	"bsky": "bsky",
+	"website": "globe",
 }
 
 
-def build_members(ssg: SiteGenerator, posts) -> list[dict]:
+def build_members(ssg: SiteGenerator, posts: ContentIndex) -> list[dict]:
 	members = []
+	pages = []
 
 	for dirname, file, name, _ in recurse_files("member", [".md"]):
 		src_path = path.join(dirname, file)
@@ -75,27 +82,49 @@ def build_members(ssg: SiteGenerator, posts) -> list[dict]:
 			}
 			for k, v in pg.meta["links"].items()
 		]
-		member_posts = list(filter(lambda x: name in x["authors"], posts))
+		member_posts = post_listing(posts.by_author(name))
 		links.sort(key=lambda x: x["name"])
 
 		if not pg.meta.get("pfp"):
-			pg.set_params(pfp=f"/public/pfp/{name}.avif")
+			pg.set_params(pfp=ssg.asset(f"public/pfp/{name}.avif"))
 
 		pg.set_params(link_data=links, username=name, posts=member_posts)
 
 		members.append(pg.meta | {"url": "/" + dist_path.removesuffix(".html")})
 
-		pg.build()
+		pages.append(pg)
+
+	ssg.build_pages(pages)
 
 	return members
 
 
 @cli.entrypoint(ssg, extra_watches=["../runners_common", "../solstice"])
 def build():
-	ssg.copy("public")
+	# fingerprinted assets can be cached forever by browsers, which only matters for the deployed site
+	ssg.copy("public", fingerprint=ssg.profile == "prod")
+	# smaller AVIF/WebP variants of the images in blog posts, sized for their column (see `main` in
+	# blog.css: 80rem wide plus padding, minus the 15rem table of contents and the gap)
+	ssg.images(
+		"public/img",
+		sizes="(max-width: 800px) calc(100vw - 4rem), (max-width: 88rem) calc(100vw - 27rem), 61rem",
+	)
+	# one cached sprite for the icons, instead of their markup in every page
+	ssg.icons("templates/icon")
 	ascii_logo = read_file("ascii/logo.asc")
 	ascii_name = read_file("ascii/name.asc")
 	ssg.page("index.jinja", ascii_logo=ascii_logo, ascii_name=ascii_name)
 
 	posts = build_blog(ssg)
 	_members = build_members(ssg, posts)
+
+	# only ship the glyphs the site uses; the ASCII art is part of the index page, but list it anyway so
+	# the art can change without the font missing glyphs
+	ssg.subset_fonts(
+		text_files=[
+			path.join(dirname, file) for dirname, file, _, _ in recurse_files("ascii", [".asc"])
+		]
+	)
+	# one pruned stylesheet per page instead of a chain of @imports; the funbar's bar width classes
+	# depend on each post's barcode, so keep all of them
+	ssg.bundle_css(keep=[r"w[1-6]"])
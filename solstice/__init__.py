@@ -1,7 +1,9 @@
 # ruff: noqa: F401 E402
 # pyright: reportMissingImports=false, reportMissingModuleSource=false
 from . import cli
+from .content import ContentEntry, ContentIndex
 from .log import *
+from .outputs import ArchiveOutput, FilesystemOutput, OutputBackend
 from .sitegen import (
 	MarkdownPage,
 	Page,
@@ -9,4 +11,7 @@ from .sitegen import (
 	filename_to_html,
 	read_file,
 	recurse_files,
+	sync_tree,
+	write_chunks_if_changed,
+	write_if_changed,
 )
@@ -0,0 +1,111 @@
+"""
+Content-hashed asset fingerprinting. See `SiteGenerator.copy()` and `SiteGenerator.asset()`.
+"""
+
+import posixpath
+import re
+from os import path
+from typing import TYPE_CHECKING
+
+from .cache import digest
+from .sitegen import _transfer_file, read_file, write_if_changed
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+# number of hex digits of the content hash that end up in the file name
+HASH_LENGTH = 8
+
+# `@import "x.css"`, `@import url(x.css)` and `url("x.woff2")` references in stylesheets
+_CSS_REFERENCE = re.compile(r"""(@import\s+(?:url\(\s*)?|url\(\s*)(["']?)([^"')\s;]+)\2""")
+
+
+def fingerprinted_name(name: str, content_digest: str) -> str:
+	"""
+	Inserts a content hash before the extension of a file name.
+
+	# Example
+	```python
+	fingerprinted_name("public/css/blog.css", "3f9a1c02...")  # "public/css/blog.3f9a1c02.css"
+	```
+	"""
+	base, ext = posixpath.splitext(name)
+	return f"{base}.{content_digest[:HASH_LENGTH]}{ext}"
+
+
+def _resolve_reference(stylesheet: str, ref: str) -> str | None:
+	"""Resolves a URL referenced from a stylesheet to an output-relative path, if it is a local file."""
+	if ref.startswith(("data:", "#")) or "://" in ref or ref.startswith("//"):
+		return None
+	if ref.startswith("/"):
+		return posixpath.normpath(ref.lstrip("/"))
+	return posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet), ref))
+
+
+def fingerprint_files(
+	gen: "SiteGenerator", files: list[str], fingerprinted: dict[str, str] | None = None
+) -> dict[str, str]:
+	"""
+	Writes a fingerprinted copy of each of the given output files next to it.
+
+	Stylesheets get their `@import` and `url()` references to other fingerprinted files rewritten, so
+	a stylesheet's hash also changes when anything it pulls in changes. All other files are hardlinked
+	(or copied, if that's not possible), so fingerprinting them costs no extra space.
+
+	# Arguments
+	- `gen`: The site generator the files were written by.
+	- `files`: Paths of the files, relative to the output directory, using forward slashes.
+	- `fingerprinted`: Files fingerprinted before, mapped to their fingerprinted copies, for
+	  references from the stylesheets among `files` to them.
+
+	# Returns
+	A mapping from every file to its fingerprinted copy.
+	"""
+	manifest: dict[str, str] = {}
+	stylesheets = set()
+
+	def full(name: str) -> str:
+		return path.join(gen.output_path, name)
+
+	for name in files:
+		if name.endswith(".css"):
+			stylesheets.add(name)
+			continue
+		hashed = fingerprinted_name(name, gen._file_digest(full(name)))
+		if not path.exists(full(hashed)):
+			_transfer_file(full(name), full(hashed), "hardlink")
+		manifest[name] = hashed
+
+	resolving = set()
+
+	def fingerprint_stylesheet(name: str) -> str | None:
+		if name in manifest:
+			return manifest[name]
+		if name in resolving:
+			return None  # circular import; leave the reference alone
+		resolving.add(name)
+
+		def rewrite(match: re.Match) -> str:
+			prefix, quote, ref = match.groups()
+			# keep query strings and fragments (e.g. `font.woff2?v=2#iefix`) as they are
+			split = min((i for i in (ref.find("?"), ref.find("#")) if i >= 0), default=len(ref))
+			target = _resolve_reference(name, ref[:split])
+			if target in stylesheets:
+				hashed = fingerprint_stylesheet(target)
+			else:
+				hashed = manifest.get(target or "") or (fingerprinted or {}).get(target or "")
+			if hashed is None:
+				return match.group(0)
+			new_ref = ref[: ref.rfind("/", 0, split) + 1] + posixpath.basename(hashed) + ref[split:]
+			return prefix + quote + new_ref + quote
+
+		contents = _CSS_REFERENCE.sub(rewrite, read_file(full(name)))
+		hashed = fingerprinted_name(name, digest(contents))
+		write_if_changed(full(hashed), contents)
+		manifest[name] = hashed
+		return hashed
+
+	for name in sorted(stylesheets):
+		fingerprint_stylesheet(name)
+
+	return manifest
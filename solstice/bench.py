@@ -0,0 +1,333 @@
+"""
+Build benchmarks on synthetic sites shaped like `main-site`.
+
+Run `python -m solstice.bench --help` for usage. Results are written as JSON, and can be compared
+against a saved baseline to catch regressions:
+
+```sh
+python -m solstice.bench --output baseline.json
+# ...make some changes...
+python -m solstice.bench --output results.json --baseline baseline.json
+```
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from os import path
+from typing import Any, Literal
+
+from .content import ContentIndex
+from .log import info, success, warn
+from .sitegen import MarkdownPage, SiteGenerator
+
+# bump this whenever the generated corpus or the measured scenarios change, so results stay comparable
+BENCH_VERSION = 1
+
+DEFAULT_CORPUS = {
+	"posts": 100,
+	"members": 10,
+	"code_blocks": 4,
+	"math_blocks": 2,
+	"assets": 50,
+	"seed": 0,
+}
+
+# a scenario is flagged as a regression if it got slower than this, relative to the baseline
+DEFAULT_THRESHOLD = 0.1
+
+_TEMPLATES = {
+	"base.jinja": """<!DOCTYPE html>
+<html>
+<head>
+<link rel="stylesheet" href="{{ asset('public/css/common.css') }}" />
+{% block head %}{% endblock %}
+</head>
+<body>{% block body %}{% endblock %}</body>
+</html>
+""",
+	"comps.jinja": """{% macro postlist(posts) %}
+<ul>
+{% for post in posts %}
+	<li><a href="{{ post.url }}">{{ post.title }}</a> ({{ post.date }}, {{ post.authors | join(", ") }})</li>
+{% endfor %}
+</ul>
+{% endmacro %}
+""",
+	"blog.jinja": """{% extends "base.jinja" %}
+{% block head %}<title>{{ title }}</title>{% endblock %}
+{% block body %}
+<aside>{{ toc | safe }}</aside>
+<main><h1>{{ title }}</h1>{{ content | safe }}</main>
+{% endblock %}
+""",
+	"blog-overview.jinja": """{% import "comps.jinja" as comps %}
+{% extends "base.jinja" %}
+{% block body %}{{ comps.postlist(posts) }}{% endblock %}
+""",
+	"member.jinja": """{% import "comps.jinja" as comps %}
+{% extends "base.jinja" %}
+{% block body %}
+<img src="{{ pfp }}" alt="{{ username }}" />
+{{ content | safe }}
+{{ comps.postlist(posts) }}
+{% endblock %}
+""",
+}
+
+_WORDS = (
+	"build cache template render page site static markdown block code math cat state pipeline "
+	"shellcode compile fast slow frame vector tensor quantum runner solstice"
+).split()
+
+_CODE = {
+	"python": "def f{i}(xs):\n    return [x * {i} for x in xs if x % 2 == 0]\n",
+	"cpp": "template <typename T>\nconstexpr T f{i}(T x) {{\n    return x * {i};\n}}\n",
+	"rust": "fn f{i}(xs: &[u32]) -> u32 {{\n    xs.iter().map(|x| x * {i}).sum()\n}}\n",
+}
+
+
+def _prose(rng: random.Random, sentences: int) -> str:
+	return " ".join(
+		" ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 14))).capitalize() + "."
+		for _ in range(sentences)
+	)
+
+
+def generate_corpus(
+	root: str,
+	posts: int = DEFAULT_CORPUS["posts"],
+	members: int = DEFAULT_CORPUS["members"],
+	code_blocks: int = DEFAULT_CORPUS["code_blocks"],
+	math_blocks: int = DEFAULT_CORPUS["math_blocks"],
+	assets: int = DEFAULT_CORPUS["assets"],
+	seed: int = DEFAULT_CORPUS["seed"],
+):
+	"""
+	Write a synthetic site to `root`: templates, blog posts, member pages and static assets laid out
+	like `main-site`. The same arguments always produce the same site.
+
+	# Arguments
+	- `posts`: Number of blog posts.
+	- `members`: Number of members; every post gets one or two of them as authors.
+	- `code_blocks`: Number of fenced code blocks per post.
+	- `math_blocks`: Number of display math blocks per post (plus as many inline formulas).
+	- `assets`: Number of files in `public/`, besides the stylesheets.
+	- `seed`: Seed for the generated content.
+	"""
+	rng = random.Random(seed)
+	for sub in ("templates", "blog", "member", "public/css", "public/img", "public/pfp"):
+		os.makedirs(path.join(root, sub), exist_ok=True)
+
+	for name, source in _TEMPLATES.items():
+		with open(path.join(root, "templates", name), "w") as file:
+			file.write(source)
+
+	with open(path.join(root, "public/css/theme.css"), "w") as file:
+		file.write(":root { --bg: #101014; --fg: #e0e0e8; }\n")
+	with open(path.join(root, "public/css/common.css"), "w") as file:
+		file.write('@import "theme.css";\nbody { background: var(--bg); color: var(--fg); }\n')
+	for i in range(assets):
+		with open(path.join(root, f"public/img/{i}.bin"), "wb") as file:
+			file.write(rng.randbytes(rng.randint(256, 4096)))
+
+	names = [f"member{i}" for i in range(max(members, 1))]
+	for name in names:
+		with open(path.join(root, f"public/pfp/{name}.avif"), "wb") as file:
+			file.write(rng.randbytes(512))
+		with open(path.join(root, f"member/{name}.md"), "w") as file:
+			file.write(f"---\nlinks:\n  github: {name}\n---\n\n{_prose(rng, 3)}\n")
+
+	for i in range(posts):
+		authors = rng.sample(names, min(len(names), rng.randint(1, 2)))
+		date = f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}"
+		body = [f"---\ntitle: Post {i}\nauthors: {json.dumps(authors)}\ndate: {date}\n---\n"]
+		for section in range(max(code_blocks, math_blocks, 1)):
+			body.append(f"## Section {section}\n\n{_prose(rng, 5)}\n")
+			if section < code_blocks:
+				lang = rng.choice(list(_CODE))
+				body.append(f"```{lang}\n{_CODE[lang].format(i=i * 100 + section)}```\n")
+			if section < math_blocks:
+				n = i * 100 + section
+				body.append(f"Inline math: $x_{{{n}}}^2 + y^2$.\n")
+				body.append(f"$$\n\\sum_{{k=0}}^{{{n}}} \\frac{{k^2}}{{{n} + 1}}\n$$\n")
+		with open(path.join(root, f"blog/post{i}.md"), "w") as file:
+			file.write("\n".join(body))
+
+
+def build_corpus(ssg: SiteGenerator):
+	"""Build a site written by `generate_corpus()`, the same way `main-site` builds itself."""
+	ssg.copy("public", fingerprint=ssg.profile == "prod")
+
+	posts = ContentIndex(ssg, "blog")
+	ssg.build_pages(MarkdownPage(ssg, "blog.jinja", p.source_path, p.output_path) for p in posts)
+
+	def listing(entries):
+		return [entry.meta | {"url": entry.url} for entry in entries]
+
+	ssg.page("blog-overview.jinja", "blog/index.html", posts=listing(posts.by_date()))
+
+	ssg.build_pages(
+		MarkdownPage(ssg, "member.jinja", m.source_path, m.output_path).set_params(
+			username=m.name,
+			pfp=ssg.asset(f"public/pfp/{m.name}.avif"),
+			posts=listing(posts.by_author(m.name)),
+		)
+		for m in ContentIndex(ssg, "member")
+	)
+
+
+def _reset_process_caches():
+	"""Forget everything cached in memory for the lifetime of the process, so cold builds are cold."""
+	from . import extensions
+
+	extensions._caches.clear()
+
+
+def _timed_build(root: str, profile: Literal["dev", "prod"], jobs: int | None) -> float:
+	cwd = os.getcwd()
+	# silence the per-page logs; they'd dominate the output (and the timings) of large corpora
+	stderr, sys.stderr = sys.stderr, open(os.devnull, "w")
+	try:
+		start = time.perf_counter()
+		with SiteGenerator(root, profile=profile, jobs=jobs) as ssg:
+			build_corpus(ssg)
+			elapsed = time.perf_counter() - start
+		return elapsed
+	finally:
+		sys.stderr.close()
+		sys.stderr = stderr
+		os.chdir(cwd)
+
+
+def run_benchmark(
+	corpus: dict[str, int] | None = None,
+	repeat: int = 3,
+	profile: Literal["dev", "prod"] = "dev",
+	jobs: int | None = None,
+) -> dict[str, Any]:
+	"""
+	Generate a synthetic site and time building it with a new `SiteGenerator` in three scenarios:
+	- `cold`: without any output or caches.
+	- `warm`: again, without any changes.
+	- `edit`: after editing the prose of a single post.
+
+	Every scenario is run `repeat` times; the median is what gets compared against a baseline.
+
+	# Returns
+	The results, ready to be saved as JSON.
+	"""
+	corpus = DEFAULT_CORPUS | (corpus or {})
+	runs: dict[str, list[float]] = {"cold": [], "warm": [], "edit": []}
+
+	with tempfile.TemporaryDirectory(prefix="solstice-bench-") as tmp:
+		root = path.join(tmp, "site")
+		generate_corpus(root, **corpus)
+		edited = path.join(root, "blog", "post0.md")
+		if not path.exists(edited):
+			edited = path.join(root, "member", "member0.md")
+
+		for i in range(repeat):
+			for leftover in ("dist", ".solstice-cache"):
+				shutil.rmtree(path.join(root, leftover), ignore_errors=True)
+			_reset_process_caches()
+			runs["cold"].append(_timed_build(root, profile, jobs))
+			runs["warm"].append(_timed_build(root, profile, jobs))
+			with open(edited, "a") as file:
+				file.write(f"\nEdit number {i}.\n")
+			runs["edit"].append(_timed_build(root, profile, jobs))
+
+	return {
+		"version": BENCH_VERSION,
+		"corpus": corpus,
+		"profile": profile,
+		"jobs": jobs or os.cpu_count() or 1,
+		"environment": {
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"cpus": os.cpu_count(),
+		},
+		"scenarios": {
+			name: {"median": statistics.median(times), "runs": times}
+			for name, times in runs.items()
+		},
+	}
+
+
+def compare_results(
+	results: dict[str, Any], baseline: dict[str, Any], threshold: float = DEFAULT_THRESHOLD
+) -> list[str]:
+	"""
+	Compare benchmark results against a baseline.
+
+	# Returns
+	A description of every scenario that got more than `threshold` (a fraction) slower. Empty if there
+	are no regressions.
+	"""
+	for key in ("version", "corpus", "profile", "jobs"):
+		if results.get(key) != baseline.get(key):
+			warn(f"baseline was measured with a different {key}, comparison may be meaningless")
+
+	regressions = []
+	for name, scenario in results["scenarios"].items():
+		if (base := baseline.get("scenarios", {}).get(name)) is None:
+			continue
+		ratio = scenario["median"] / base["median"]
+		line = f"{name}: {base['median'] * 1000:.0f}ms -> {scenario['median'] * 1000:.0f}ms ({ratio - 1:+.0%})"
+		if ratio > 1 + threshold:
+			regressions.append(line)
+		else:
+			info(line)
+	return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(
+		"solstice.bench", description="Benchmark site builds on a synthetic corpus."
+	)
+	for key, default in DEFAULT_CORPUS.items():
+		parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=default)
+	parser.add_argument("--repeat", type=int, default=3, help="runs per scenario")
+	parser.add_argument("--release", action="store_true", help="build with the production profile")
+	parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: CPU count)")
+	parser.add_argument("-o", "--output", metavar="FILE", help="write the results to FILE as JSON")
+	parser.add_argument("--baseline", metavar="FILE", help="compare against results saved earlier")
+	parser.add_argument(
+		"--threshold",
+		type=float,
+		default=DEFAULT_THRESHOLD,
+		help="slowdown (as a fraction) that counts as a regression",
+	)
+	args = parser.parse_args(argv)
+
+	corpus = {key: getattr(args, key) for key in DEFAULT_CORPUS}
+	info(f"Benchmarking {corpus}, {args.repeat} run(s) per scenario...")
+	results = run_benchmark(corpus, args.repeat, "prod" if args.release else "dev", args.jobs)
+	for name, scenario in results["scenarios"].items():
+		info(f"{name}: {scenario['median'] * 1000:.0f}ms (median)")
+
+	if args.output:
+		with open(args.output, "w") as file:
+			json.dump(results, file, indent="\t")
+		info(f"Results written to {args.output}")
+
+	if args.baseline:
+		with open(args.baseline) as file:
+			regressions = compare_results(results, json.load(file), args.threshold)
+		for line in regressions:
+			warn(f"regression in {line}")
+		if regressions:
+			return 1
+		success("No regressions")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Persistent caches that let solstice skip work that was already done in a previous build.
+"""
+
+import hashlib
+import os
+import pickle
+from os import path
+from typing import Any
+
+__all__ = ["DiskCache", "digest"]
+
+
+def digest(*parts: bytes | str) -> str:
+	"""
+	Hash the given parts into a single hex digest. Strings are encoded as UTF-8.
+	Every part is length-prefixed, so `digest("ab", "c")` and `digest("a", "bc")` differ.
+	"""
+	hasher = hashlib.sha256()
+	for part in parts:
+		if isinstance(part, str):
+			part = part.encode()
+		hasher.update(len(part).to_bytes(8, "little"))
+		hasher.update(part)
+	return hasher.hexdigest()
+
+
+class DiskCache:
+	"""
+	Key-value store that keeps every entry as a pickle file on disk, with an in-memory layer in front
+	of it so a long-running process (e.g. `serve`) doesn't hit the disk for entries it has seen before.
+
+	Keys are expected to be hex digests (see `digest()`); values can be anything picklable.
+	Entries are written atomically, so multiple processes can safely share the same cache directory.
+
+	# Example
+	```python
+	cache = DiskCache(".solstice-cache", "markdown")
+	key = digest(source)
+	if (html := cache.get(key)) is None:
+		html = expensive_conversion(source)
+		cache.set(key, html)
+	```
+	"""
+
+	def __init__(self, root: str, namespace: str):
+		self.dir = path.join(root, namespace)
+		self._memory: dict[str, bytes] = {}
+
+	def _path_for(self, key: str) -> str:
+		return path.join(self.dir, key[:2], key)
+
+	def get(self, key: str, default: Any = None) -> Any:
+		"""Returns the value stored for `key`, or `default` if there is none."""
+		data = self._memory.get(key)
+		if data is None:
+			try:
+				with open(self._path_for(key), "rb") as file:
+					data = file.read()
+			except FileNotFoundError:
+				return default
+		try:
+			value = pickle.loads(data)
+		except Exception:
+			# corrupted or written by an incompatible version; treat it as a miss
+			self._memory.pop(key, None)
+			return default
+		self._memory[key] = data
+		return value
+
+	def set(self, key: str, value: Any, persist: bool = True):
+		"""
+		Stores `value` for `key` in memory, and on disk unless `persist` is `False` (e.g. because
+		another process already wrote the entry).
+		"""
+		data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+		self._memory[key] = data
+		if not persist:
+			return
+
+		dest = self._path_for(key)
+		os.makedirs(path.dirname(dest), exist_ok=True)
+		tmp = f"{dest}.{os.getpid()}.tmp"
+		with open(tmp, "wb") as file:
+			file.write(data)
+		os.replace(tmp, dest)
@@ -1,11 +1,15 @@
 import argparse
 import importlib
+import json
 import os
 import sys
 from enum import Enum
 from typing import Any
 
-from .log import info, warn
+from .compress import available_encodings, negotiate
+from .livereload import EVENTS_URL, LiveReload, inject_client
+from .log import info, span, start_trace, warn, write_trace
+from .outputs import ArchiveOutput
 from .sitegen import SiteGenerator
 
 
@@ -15,8 +19,26 @@ def parse_cli():
 	"""
 	parser = argparse.ArgumentParser("solstice", description="")
 	parser.add_argument("cmd", nargs="?", default="build", help='"build", "clean", or "serve"')
-	parser.add_argument("--release", action="store_true")
+	parser.add_argument(
+		"--release", action="store_true", help="build with the production profile (minified output)"
+	)
 	parser.add_argument("-p", "--port", default=5123, type=int)
+	parser.add_argument(
+		"--trace",
+		metavar="FILE",
+		help="write a trace of where the build spends its time to FILE, in Chrome trace event format",
+	)
+	parser.add_argument(
+		"--changes",
+		metavar="FILE",
+		help="write the outputs that were added, changed or removed by the build to FILE, as JSON",
+	)
+
+	parser.add_argument(
+		"--archive",
+		metavar="FILE",
+		help="also pack the built site into FILE (.zip, .tar, .tar.gz or .tar.xz), e.g. as a deploy artifact",
+	)
 
 	args = parser.parse_args()
 
@@ -25,6 +47,8 @@ def parse_cli():
 
 # hot reloading requires build_func to be replaced so we can't use e.g. a function parameter to communicate it
 build_func: Any = None
+# the generator build_func builds with; reloading the project module creates a new one
+build_ssg: Any = None
 
 
 def entrypoint(ssg: SiteGenerator, extra_watches: list[str] | None = None):
@@ -47,36 +71,63 @@ def entrypoint(ssg: SiteGenerator, extra_watches: list[str] | None = None):
 	"""
 
 	def inner(func):
-		global build_func
+		global build_func, build_ssg
+		import multiprocessing
+
+		# worker processes (see `SiteGenerator.build_pages`) re-import the main module; the CLI only runs in the parent
+		if multiprocessing.parent_process() is not None:
+			return func
+
 		# the hot reloading code calls importlib.reload which will rerun the entrypoint function; in that case we should just replace the function and not continue with the rest of the cli
 		if _http_server:
-			build_func = func
+			# the generator of the previous module is gone for good, and so are its workers
+			if build_ssg is not ssg:
+				build_ssg.close()
+			build_func, build_ssg = func, ssg
 			return
 
 		args = parse_cli()
+		if args.release:
+			ssg.set_profile("prod")
 		match args.cmd:
 			case "build":  # Build the website
-				func()
+				if args.trace:
+					start_trace()
+				if args.archive:
+					# relative to where the command was run, not the project directory
+					ssg.output_backend = ArchiveOutput(os.path.join(ssg.original_cwd, args.archive))
+				with span("build"), ssg, ssg.build_session() as changes:
+					func()
+				if args.changes:
+					with open(args.changes, "w") as file:
+						json.dump(changes, file, indent="\t")
+				if args.trace:
+					write_trace(args.trace)
+					info(f"Trace written to {args.trace}")
 			case "clean":  # Clean output dir
 				ssg.clean()
 			case "serve":  # Serve with hot-reloading
 				import threading
 
-				ssg.clean()
-
-				thread = threading.Thread(target=run_http_server, args=(args.port, ssg.output_path))
+				# no need to clean first; outputs that are no longer produced are removed after every build
+				live = LiveReload()
+				thread = threading.Thread(
+					target=run_http_server, args=(args.port, ssg.output_path, live)
+				)
 				thread.start()
 
-				build_func = func
+				build_func, build_ssg = func, ssg
 				try:
-					hotreload(ssg, extra_watches=extra_watches or [])
+					hotreload(ssg, extra_watches=extra_watches or [], trace=args.trace, live=live)
 				except KeyboardInterrupt:  # Ctrl+C, finalize
 					sys.stderr.write("\x1b[0J")  # clear from cursor down
 					sys.stderr.flush()
 					info("Shutting down cleanly...")
 					assert _http_server
+					live.close()
 					_http_server.shutdown()
 					thread.join()
+					build_ssg.close()
 		return func
 
 	return inner
@@ -87,14 +138,41 @@ _http_server = None
 _http_server_exception = None
 
 
-def run_http_server(port, dir):
+def run_http_server(port, dir, live: LiveReload | None = None):
 	"""
-	Background process that serves the content at `dir`
+	Background process that serves the content at `dir`. Requests are handled concurrently, over
+	keep-alive connections.
+
+	With `live`, pages get a script that listens for the changes of every build (see
+	`LiveReload.notify()`) and reloads the page or swaps its stylesheets when they're affected.
+
+	Every response carries the content hash of the file it sends as its `ETag` (the same hash the
+	build manifest records, see `SiteGenerator.build_session()`) and has to be revalidated before
+	each use, so browsers never show stale content but get a `304 Not Modified` for every file that
+	didn't change since they last fetched it.
 	"""
 	global _http_server
 	try:
-		from http.server import SimpleHTTPRequestHandler
-		from socketserver import TCPServer
+		import hashlib
+		import io
+		from http import HTTPStatus
+		from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+		from urllib.parse import parse_qs, urlsplit
+
+		# absolute path -> (stat stamp, content hash); shared by all handler threads
+		digests: dict[str, tuple[tuple[int, int, int], str]] = {}
+
+		def etag_of(file_path: str, file) -> str:
+			# hash the open file rather than the path, so the tag always matches what is sent, even
+			# when a rebuild replaces the file in the meantime
+			stat = os.fstat(file.fileno())
+			stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+			cached = digests.get(file_path)
+			if cached is None or cached[0] != stamp:
+				cached = (stamp, hashlib.file_digest(file, "sha256").hexdigest())
+				digests[file_path] = cached
+				file.seek(0)
+			return f'"{cached[1]}"'
 
 		class Handler(SimpleHTTPRequestHandler):
 			protocol_version = "HTTP/1.1"
@@ -106,50 +184,166 @@ def run_http_server(port, dir):
 				pass
 
 			def send_head(self):
-				# Do not remove!
-				# Firefox doesn't play well with Python's HTTP server caching, therefore we disable caching altogether.
-				# This is not a big deal as this server is only for development anyway.
-				if "If-Modified-Since" in self.headers:
-					del self.headers["If-Modified-Since"]
-				if "If-None-Match" in self.headers:
-					del self.headers["If-None-Match"]
-				return super().send_head()
+				file_path = self.translate_path(self.path)
+				if os.path.isdir(file_path):
+					index = os.path.join(file_path, "index.html")
+					if not urlsplit(self.path).path.endswith("/") or not os.path.isfile(index):
+						# redirect to the URL with a trailing slash, or list the directory
+						return super().send_head()
+					file_path = index
+				if not os.path.isfile(file_path):
+					self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+					return None
+
+				if live is not None and file_path.endswith(".html"):
+					return self.send_live_page(file_path, live)
+
+				# serve the precompressed files of release builds like a production server would
+				siblings = {
+					encoding.name: file_path + encoding.suffix
+					for encoding in available_encodings()
+					if os.path.isfile(file_path + encoding.suffix)
+				}
+				coding = negotiate(self.headers.get("Accept-Encoding", ""), list(siblings))
+				try:
+					file = open(siblings[coding] if coding else file_path, "rb")
+				except OSError:
+					self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+					return None
+
+				try:
+					size = os.fstat(file.fileno()).st_size
+					etag = etag_of(file.name, file)
+					if not self.send_content_head(file_path, etag, size, coding, bool(siblings)):
+						file.close()
+						return None
+				except BaseException:
+					file.close()
+					raise
+				return file
+
+			def send_live_page(self, file_path: str, live: LiveReload):
+				"""Sends a page with the live reload client added, uncompressed; see `inject_client()`."""
+				try:
+					file = open(file_path, "rb")
+				except OSError:
+					self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+					return None
+				with file:
+					# the tag stays the same as long as the page does: a page from an older build only
+					# learns about changes it already has, which doesn't reload it
+					etag = etag_of(file.name, file).removesuffix('"') + '-live"'
+					data = inject_client(file.read(), live.event_id())
+				if not self.send_content_head(file_path, etag, len(data), None, False):
+					return None
+				return io.BytesIO(data)
+
+			def send_events(self, live: LiveReload):
+				"""Streams the changes of every build to the live reload client, as server-sent events."""
+				query = parse_qs(urlsplit(self.path).query)
+				last_event_id = (
+					self.headers.get("Last-Event-ID")
+					or query.get("since", [None])[0]
+					or live.event_id()  # only changes from now on
+				)
+
+				self.close_connection = True
+				self.send_response(HTTPStatus.OK)
+				self.send_header("Content-Type", "text/event-stream")
+				self.end_headers()
+				try:
+					while not live.closed:
+						event = live.wait(last_event_id, timeout=15)
+						if event is None:
+							self.wfile.write(b": keep-alive\n\n")  # notices closed connections
+						else:
+							last_event_id, changed = event
+							self.wfile.write(live.format_event(last_event_id, changed))
+						self.wfile.flush()
+				except (BrokenPipeError, ConnectionResetError):
+					pass  # the page was closed or reloaded
+
+			def send_content_head(
+				self, name: str, etag: str, size: int, coding: str | None, vary: bool
+			) -> bool:
+				"""
+				Sends the status and headers for the file `name`, or `304 Not Modified` if the client
+				has it already.
+
+				# Returns
+				Whether the body should be sent.
+				"""
+				modified = not self.etag_matches(etag)
+				if modified:
+					self.send_response(HTTPStatus.OK)
+					self.send_header("Content-Type", self.guess_type(name))
+					if coding:
+						self.send_header("Content-Encoding", coding)
+					self.send_header("Content-Length", str(size))
+				else:
+					self.send_response(HTTPStatus.NOT_MODIFIED)
+				self.send_header("ETag", etag)
+				if vary:
+					self.send_header("Vary", "Accept-Encoding")
+				self.end_headers()
+				return modified
+
+			def etag_matches(self, etag: str) -> bool:
+				"""Whether the client's `If-None-Match` header lists `etag`."""
+				header = self.headers.get("If-None-Match")
+				if header is None:
+					return False
+				tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+				return "*" in tags or etag in tags
 
 			# from https://stackoverflow.com/questions/28419287/configuring-simplehttpserver-to-assume-html-for-suffixless-urls
 			def do_GET(self):
+				if live is not None and urlsplit(self.path).path == EVENTS_URL:
+					return self.send_events(live)
+				self.assume_html()
+				super().do_GET()
+
+			def do_HEAD(self):
+				self.assume_html()
+				super().do_HEAD()
+
+			def assume_html(self):
 				path = self.translate_path(self.path)
 
 				# If the path doesn't exist, assume it's a resource suffixed '.html'.
 				if not os.path.exists(path):
 					self.path = self.path + ".html"
 
-				super().do_GET()
-
 			def end_headers(self):
 				# Do not remove!
-				# Firefox also needs to be explicitly told to not cache anything with the following headers.
-				self.send_header("Connection", "close")
-				self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-				self.send_header("Pragma", "no-cache")
-				self.send_header("Expires", "0")
+				# Firefox reuses cached responses without asking when it isn't told otherwise. `no-cache`
+				# makes it revalidate every single time, which the ETags make cheap.
+				self.send_header("Cache-Control", "no-cache")
 				return super().end_headers()
 
-		class ReuseAddrTCPServer(TCPServer):
+		class ReuseAddrHTTPServer(ThreadingHTTPServer):
 			# Workaround that prevents the server from sometimes being unable to bind to the address, even if no process is currently bound to it.
 			allow_reuse_address = True
 			allow_reuse_port = True
+			# browsers open several connections at once and keep them open
+			request_queue_size = 64
+			daemon_threads = True
+			# live reload connections stay open until the page is closed; don't wait for them
+			block_on_close = False
 
-			def __init__(self, *args, **kwargs):
-				super().__init__(*args, **kwargs)
-
-		with ReuseAddrTCPServer(("", port), Handler) as server:
+		with ReuseAddrHTTPServer(("", port), Handler) as server:
 			_http_server = server
 			server.serve_forever()
 	finally:
 		_http_server_exception = sys.exception()
 
 
-def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
+def hotreload(
+	ssg: SiteGenerator,
+	extra_watches: list[str],
+	trace: str | None = None,
+	live: LiveReload | None = None,
+):
 	import time
 	import traceback
 	from datetime import datetime
@@ -159,7 +353,18 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 	import pygments.lexers
 	import watchfiles  # type: ignore (removes pyright hallucination)
 
-	it = watchfiles.watch(ssg.project_dir, *map(os.path.realpath, extra_watches))
+	# don't react to our own writes, in case the output or cache directory is inside a watched directory
+	ignored_dirs = tuple(os.path.realpath(p) + os.sep for p in (ssg.output_path, ssg.cache_path))
+	default_filter = watchfiles.DefaultFilter()
+
+	def watch_filter(change, changed_path: str) -> bool:
+		return default_filter(change, changed_path) and not changed_path.startswith(ignored_dirs)
+
+	it = watchfiles.watch(
+		ssg.project_dir,
+		*map(os.path.realpath, extra_watches),
+		watch_filter=watch_filter,
+	)
 
 	# wait for server to start
 	while True:
@@ -183,6 +388,11 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 			return self.value < other.value
 
 	reload_type = ReloadType.SOFT
+	templates_dir = os.path.realpath(ssg.templates_path) + os.sep
+	changed_templates: set[str] = set()
+	# files changed since the last successful build, for a targeted build session (see
+	# `SiteGenerator.build_session()`); `None` when everything has to be built
+	changed: set[str] | None = None
 
 	while True:
 		sys.stderr.write("\x1b[2J\x1b[H")  # clear screen, reset cursor
@@ -191,6 +401,16 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 
 		info(f"Starting build at {datetime.now()}")
 
+		if changed:
+			info(f"{len(changed)} file(s) changed, skipping the steps that don't depend on them")
+		if changed_templates:
+			affected = build_ssg.pages_affected_by(changed_templates)
+			info(f"Template changes affect {len(affected)} page(s), the rest will be skipped")
+
+		# every rebuild gets its own trace, overwriting the previous one
+		if trace:
+			start_trace()
+
 		if reload_type == ReloadType.PROJECT:
 			# find the module that corresponds to the project directory
 			try:
@@ -201,7 +421,8 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 					and module.__path__[0].startswith(ssg.project_dir)
 				)
 
-				importlib.reload(module)
+				with span("reload module", module=module.__name__):
+					importlib.reload(module)
 
 				# now do a soft reload. this is technically redundant due to the code below but y'know, readability
 				reload_type = ReloadType.SOFT
@@ -217,13 +438,19 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 			argv = ctypes.POINTER(ctypes.c_wchar_p)()
 			ctypes.pythonapi.Py_GetArgcArgv(ctypes.byref(argc), ctypes.byref(argv))
 
+			build_ssg.close()
 			os.chdir(ssg.original_cwd)
 			os.execv(sys.executable, [argv[i] for i in range(argc.value)])
 			raise Exception("unreachable; see execv call")
 
 		# reload_type == ReloadType.SOFT
 		try:
-			build_func()
+			with span("build"), build_ssg.build_session(changed) as changes:
+				build_func()
+			# changes of failed builds are kept, so the next build still covers them
+			changed = set()
+			if live is not None:
+				live.notify(changes)
 		except BaseException:
 			# catch all exceptions to prevent hot-reload breakage and output them to stderr
 			tb_text = "".join(traceback.format_exc())
@@ -233,13 +460,26 @@ def hotreload(ssg: SiteGenerator, extra_watches: list[str]):
 
 			print(tb_colored, file=sys.stderr)
 
+		if trace:
+			write_trace(trace)
+
 		# wait for next change
 		item = next(it)
 
 		reload_type = ReloadType.SOFT
+		changed_templates = set()
 		for _change_type, changed_path in item:
+			if changed is not None:
+				changed.add(changed_path)
+			if changed_path.startswith(templates_dir):
+				changed_templates.add(
+					os.path.relpath(changed_path, templates_dir).replace(os.sep, "/")
+				)
 			if changed_path.endswith(".py"):
 				if changed_path.startswith(ssg.project_dir):
 					reload_type = max(reload_type, ReloadType.PROJECT)
 				else:
 					reload_type = max(reload_type, ReloadType.FULL)
+		if reload_type != ReloadType.SOFT:
+			# a reloaded module makes a new generator, which knows nothing about the previous build
+			changed = None
@@ -0,0 +1,147 @@
+"""
+Precompressed copies of text outputs (`index.html.gz`, `index.html.br`, ...), so a server can send
+them as-is instead of compressing every response. See `SiteGenerator.build_session()`.
+"""
+
+# pyright: reportMissingImports=false, reportMissingModuleSource=false
+import gzip
+import hashlib
+from functools import cache
+from os import path
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+from .log import debug, span
+from .sitegen import write_if_changed
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+COMPRESSIBLE_EXTENSIONS = [".html", ".css", ".js", ".svg", ".asc", ".txt", ".json", ".xml"]
+
+# compressing tiny files gains nothing worth the extra request handling
+MIN_SIZE = 256
+
+
+class Encoding(NamedTuple):
+	name: str
+	""" Content coding, as used in the `Accept-Encoding` and `Content-Encoding` headers """
+
+	suffix: str
+	""" Suffix of the precompressed file, appended to the name of the original """
+
+	compress: Callable[[bytes], bytes]
+
+
+@cache
+def available_encodings() -> list[Encoding]:
+	"""
+	The encodings outputs are precompressed with, in order of preference. brotli and zstd need the
+	`brotli` and `zstandard` packages from requirements.txt; builds without them only ship gzip.
+	"""
+	# mtime=0 keeps the output deterministic, so unchanged files compress to unchanged bytes
+	encodings = [Encoding("gzip", ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+
+	try:
+		import brotli
+
+		encodings.insert(0, Encoding("br", ".br", lambda data: brotli.compress(data, quality=11)))
+	except ImportError:
+		debug("brotli isn't installed, skipping .br precompression")
+
+	try:
+		import zstandard
+
+		compressor = zstandard.ZstdCompressor(level=22)
+		encodings.insert(-1, Encoding("zstd", ".zst", compressor.compress))
+	except ImportError:
+		debug("zstandard isn't installed, skipping .zst precompression")
+
+	return encodings
+
+
+def _compress(full: str, encoding: Encoding) -> str | None:
+	"""
+	Writes the `encoding` compressed version of the file at `full` next to it.
+
+	# Returns
+	The content digest of the compressed file, or `None` if compressing didn't make the file smaller.
+	"""
+	with open(full, "rb") as file:
+		data = file.read()
+	with span("compress", file=full, encoding=encoding.name):
+		compressed = encoding.compress(data)
+	if len(compressed) >= len(data):
+		return None
+	write_if_changed(full + encoding.suffix, compressed)
+	return hashlib.sha256(compressed).hexdigest()
+
+
+def precompress(
+	gen: "SiteGenerator",
+	manifest: dict[str, tuple[str | None, str]],
+	previous: dict[str, tuple[str | None, str]],
+) -> dict[str, tuple[str | None, str]]:
+	"""
+	Writes precompressed versions of every compressible output in `manifest`. Outputs whose content
+	digest is the same as in the `previous` manifest keep their precompressed files as they are.
+
+	# Returns
+	Manifest entries for the precompressed files; they have the same source as the original.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	encodings = available_encodings()
+	result = {}
+	jobs = []
+	for name, (source, hash) in manifest.items():
+		if path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+			continue
+		full = gen.output_path_for(name)
+		if path.getsize(full) < MIN_SIZE:
+			continue
+		unchanged = name in previous and previous[name][1] == hash
+		for encoding in encodings:
+			sibling = name + encoding.suffix
+			if unchanged and sibling in previous and path.isfile(full + encoding.suffix):
+				result[sibling] = (source, previous[sibling][1])
+			else:
+				jobs.append((sibling, source, full, encoding))
+
+	if jobs:
+		# zlib, brotli and zstd all release the GIL while compressing, so threads are enough
+		with ThreadPoolExecutor(gen.jobs) as pool:
+			hashes = list(pool.map(lambda job: _compress(job[2], job[3]), jobs))
+		for (sibling, source, _full, _encoding), hash in zip(jobs, hashes):
+			if hash is not None:
+				result[sibling] = (source, hash)
+
+	debug(f"Precompressed {len(jobs)} file(s), {len(result)} precompressed file(s) in total")
+	return result
+
+
+def negotiate(accept_encoding: str, available: list[str]) -> str | None:
+	"""
+	Picks the content coding to respond with, given the `Accept-Encoding` header of a request and the
+	codings the response is `available` in, in order of preference.
+
+	# Example
+	```python
+	negotiate("gzip, deflate, br;q=0", ["br", "zstd", "gzip"])  # "gzip"
+	```
+	"""
+	accepted = {}
+	for part in accept_encoding.split(","):
+		coding, _, params = part.strip().partition(";")
+		quality = 1.0
+		params = params.strip()
+		if params.startswith("q="):
+			try:
+				quality = float(params[2:])
+			except ValueError:
+				pass
+		accepted[coding.strip().lower()] = quality
+
+	for coding in available:
+		if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+			return coding
+	return None
@@ -0,0 +1,118 @@
+"""
+Indexes of content collections (e.g. blog posts), built from frontmatter alone.
+"""
+
+from functools import cached_property
+from os import path
+from typing import TYPE_CHECKING, Any, Iterator
+
+from .sitegen import recurse_files
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+
+class ContentEntry:
+	"""A single file in a `ContentIndex`."""
+
+	source_path: str
+	""" Path to the source file """
+
+	output_path: str
+	""" Path of the page built from this file, relative to the output directory """
+
+	meta: dict[str, Any]
+	""" Frontmatter of the file """
+
+	def __init__(self, source_path: str, output_path: str, meta: dict[str, Any]):
+		self.source_path = source_path
+		self.output_path = output_path
+		self.meta = meta
+
+	@property
+	def name(self) -> str:
+		"""File name without directory and extension, e.g. `my_post` for `blog/my_post.md`."""
+		return path.splitext(path.basename(self.source_path))[0]
+
+	@property
+	def url(self) -> str:
+		"""Absolute URL of the page built from this file, without the `.html` suffix."""
+		return "/" + self.output_path.removesuffix(".html")
+
+	def __repr__(self) -> str:
+		return f"ContentEntry({self.source_path!r})"
+
+
+class ContentIndex:
+	"""
+	Index of all markdown files in a directory, built from their frontmatter only. The markdown bodies
+	are never read, so listing pages (e.g. a blog overview) stay cheap no matter how many files there
+	are; full conversion only happens when a `MarkdownPage` for a file is built.
+
+	Frontmatter is cached by file modification time (see `SiteGenerator.load_frontmatter()`).
+
+	# Example
+	```python
+	posts = ContentIndex(ssg, "blog")
+	for post in posts:
+		solstice.MarkdownPage(ssg, "blog.jinja", post.source_path, post.output_path).build()
+	ssg.page("blog-overview.jinja", "blog/index.html", posts=[p.meta for p in posts.by_date()])
+	ssg.page("author.jinja", "author/alice.html", posts=[p.meta for p in posts.by_author("alice")])
+	```
+	"""
+
+	def __init__(
+		self,
+		gen: "SiteGenerator",
+		root: str,
+		extensions: list[str] | None = None,
+		author_key: str = "authors",
+		date_key: str = "date",
+	):
+		"""
+		# Arguments
+		- `gen`: The site generator to load frontmatter with.
+		- `root`: The directory to index, recursively.
+		- `extensions`: File extensions to include. Defaults to `[".md"]`.
+		- `author_key`: Frontmatter key holding the list of authors, used by `by_author()`.
+		- `date_key`: Frontmatter key holding the date, used by `by_date()`.
+		"""
+		self.author_key = author_key
+		self.date_key = date_key
+		self.entries: list[ContentEntry] = [
+			ContentEntry(
+				path.join(dirname, file),
+				path.join(dirname, name + ".html"),
+				gen.load_frontmatter(path.join(dirname, file)),
+			)
+			for dirname, file, name, _ in recurse_files(root, extensions or [".md"])
+		]
+
+	def __iter__(self) -> Iterator[ContentEntry]:
+		return iter(self.entries)
+
+	def __len__(self) -> int:
+		return len(self.entries)
+
+	@cached_property
+	def _by_date(self) -> list[ContentEntry]:
+		# entries without a date sort last
+		dated = [e for e in self.entries if e.meta.get(self.date_key) is not None]
+		undated = [e for e in self.entries if e.meta.get(self.date_key) is None]
+		return sorted(dated, key=lambda e: e.meta[self.date_key], reverse=True) + undated
+
+	@cached_property
+	def _by_author(self) -> dict[str, list[ContentEntry]]:
+		authors: dict[str, list[ContentEntry]] = {}
+		for entry in self._by_date:
+			for author in entry.meta.get(self.author_key) or ():
+				authors.setdefault(author, []).append(entry)
+		return authors
+
+	def by_date(self) -> list[ContentEntry]:
+		"""All entries, newest first. Entries with the same date keep their order in the index."""
+		return list(self._by_date)
+
+	def by_author(self, author: str) -> list[ContentEntry]:
+		"""All entries listing `author` among their authors, newest first."""
+		return list(self._by_author.get(author, ()))
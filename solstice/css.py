@@ -0,0 +1,405 @@
+"""
+One stylesheet per page instead of a chain of `<link>`s and `@import`s, with the rules no page uses
+removed. See `SiteGenerator.bundle_css()`.
+"""
+
+import hashlib
+import posixpath
+import re
+from functools import lru_cache
+from os import path
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+from .assets import _CSS_REFERENCE, _resolve_reference, fingerprinted_name
+from .cache import digest
+from .sitegen import CACHE_VERSION, read_file, write_if_changed
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+# at-rules whose blocks contain regular style rules, which are pruned like top-level ones. the blocks of
+# all other at-rules (`@font-face`, `@keyframes`, ...) are kept as they are
+_GROUPING_RULES = {"media", "supports", "container", "layer", "scope", "document"}
+
+_CSS_TOKEN = re.compile(
+	r"""/\*.*?(?:\*/|$)|"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|\\.|[(){};]|[^/"'\\(){};]+|/""",
+	re.S,
+)
+_IMPORT = re.compile(r"""@import\s+(?:url\(\s*)?(["']?)([^"')\s;]+)\1\s*\)?\s*([^;]*)""", re.I)
+
+_TAG = re.compile(r"<([a-zA-Z][\w:-]*)([^>]*)>")
+_ATTRIBUTE = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?""")
+# elements whose contents aren't markup, and comments
+_NOT_MARKUP = re.compile(r"<(style|script)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+
+# everything a selector requires of an element that can be checked against the classes, ids and tag
+# names in a page: `.class`, `#id` and type selectors at the start of a compound selector
+_SELECTOR_NAMES = re.compile(r"([.#]?)((?:\\.|[\w-])+)")
+_PSEUDO = re.compile(r"::?[\w-]+")
+
+
+class _Block(NamedTuple):
+	prelude: str
+	children: list["str | _Block"]
+
+
+def parse_css(source: str) -> list[str | _Block]:
+	"""
+	Parses a stylesheet into a tree of statements and declarations (as strings, without the trailing
+	`;`) and blocks. Nested rules end up as blocks inside their parent rule. Comments are dropped.
+	"""
+	root: list[str | _Block] = []
+	stack = [root]
+	text: list[str] = []
+	parens = 0
+
+	def flush():
+		if statement := "".join(text).strip():
+			stack[-1].append(statement)
+		text.clear()
+
+	for match in _CSS_TOKEN.finditer(source):
+		token = match.group(0)
+		if token.startswith("/*"):
+			continue
+		if token == "(":
+			parens += 1
+		elif token == ")":
+			parens = max(parens - 1, 0)
+		elif parens == 0 and token == ";":
+			flush()
+			continue
+		elif parens == 0 and token == "{":
+			block = _Block(" ".join("".join(text).split()), [])
+			text.clear()
+			stack[-1].append(block)
+			stack.append(block.children)
+			continue
+		elif parens == 0 and token == "}":
+			flush()
+			if len(stack) > 1:
+				stack.pop()
+			continue
+		text.append(token)
+	flush()
+	return root
+
+
+def serialize_css(nodes: list[str | _Block]) -> str:
+	"""Turns a tree from `parse_css()` back into a stylesheet."""
+	return "".join(
+		f"{node.prelude}{{{serialize_css(node.children)}}}"
+		if isinstance(node, _Block)
+		else node + ";"
+		for node in nodes
+	)
+
+
+def _split_top_level(text: str, separator: str = ",") -> list[str]:
+	"""Splits `text` at every `separator` that isn't inside parentheses, brackets or a string."""
+	parts = []
+	depth = 0
+	start = 0
+	quote = None
+	i = 0
+	while i < len(text):
+		char = text[i]
+		if char == "\\":
+			i += 2
+			continue
+		if quote:
+			if char == quote:
+				quote = None
+		elif char in "\"'":
+			quote = char
+		elif char in "([":
+			depth += 1
+		elif char in ")]":
+			depth -= 1
+		elif char == separator and depth == 0:
+			parts.append(text[start:i].strip())
+			start = i + 1
+		i += 1
+	parts.append(text[start:].strip())
+	return [part for part in parts if part]
+
+
+def _strip_arguments(selector: str) -> str:
+	"""Removes attribute selectors, strings and the arguments of functional pseudo-classes."""
+	result = []
+	depth = 0
+	quote = None
+	i = 0
+	while i < len(selector):
+		char = selector[i]
+		if char == "\\":
+			if depth == 0 and not quote:
+				result.append(selector[i : i + 2])
+			i += 2
+			continue
+		if quote:
+			if char == quote:
+				quote = None
+		elif char in "\"'":
+			quote = char
+		elif char in "([":
+			depth += 1
+		elif char in ")]":
+			depth = max(depth - 1, 0)
+		elif depth == 0:
+			result.append(char)
+		i += 1
+	return "".join(result)
+
+
+def selector_requirements(selector: str) -> list[tuple[str, str]]:
+	"""
+	The classes (`"."`), ids (`"#"`) and tag names (`""`) an element (or its ancestors or siblings)
+	must have for `selector` to match. Whatever is inside `:not()`, `:is()`, `:has()` and other
+	functional pseudo-classes is left out, as is anything in attribute selectors, so the result only
+	ever errs on the side of matching.
+
+	# Example
+	```python
+	selector_requirements("nav > a.active:not(.hidden)::after")  # [("", "nav"), ("", "a"), (".", "active")]
+	```
+	"""
+	selector = _PSEUDO.sub(" ", _strip_arguments(selector))
+	requirements = []
+	for match in _SELECTOR_NAMES.finditer(selector):
+		kind, name = match.groups()
+		start = match.start()
+		if kind == "" and start > 0 and selector[start - 1] not in " \t\n>+~&,(":
+			continue  # part of something else, e.g. the `2` in `h2`
+		if kind == "" and not name[0].isalpha():
+			continue  # e.g. percentages in a stray keyframe selector
+		name = re.sub(r"\\(.)", r"\1", name)
+		requirements.append((kind, name.lower() if kind == "" else name))
+	return requirements
+
+
+def prune_css(nodes: list[str | _Block], used: Callable[[str, str], bool]) -> list[str | _Block]:
+	"""
+	Removes the selectors from a tree from `parse_css()` that can't match anything, according to
+	`used(kind, name)` (see `selector_requirements()`). Rules without any selectors or contents left,
+	and grouping at-rules (`@media`, ...) without any rules left, are dropped entirely.
+	"""
+	result: list[str | _Block] = []
+	for node in nodes:
+		if not isinstance(node, _Block):
+			result.append(node)
+		elif node.prelude.startswith("@"):
+			name = re.match(r"@([\w-]*)", node.prelude).group(1).lower()  # type: ignore
+			if name not in _GROUPING_RULES:
+				result.append(node)
+			elif children := prune_css(node.children, used):
+				result.append(_Block(node.prelude, children))
+		else:
+			selectors = [
+				selector
+				for selector in _split_top_level(node.prelude)
+				if all(used(kind, name) for kind, name in selector_requirements(selector))
+			]
+			if selectors and (children := prune_css(node.children, used)):
+				result.append(_Block(",".join(selectors), children))
+	return result
+
+
+def page_names(html: str) -> set[tuple[str, str]]:
+	"""The classes, ids and tag names used in a page, in the format of `selector_requirements()`."""
+	names = set()
+	for tag, attributes in _TAG.findall(_NOT_MARKUP.sub("", html)):
+		names.add(("", tag.lower()))
+		for name, *values in _ATTRIBUTE.findall(attributes):
+			value = next((v for v in values if v), "")
+			match name.lower():
+				case "class":
+					names.update((".", cls) for cls in value.split())
+				case "id":
+					names.add(("#", value))
+	return names
+
+
+def _stylesheet_links(gen: "SiteGenerator", page: str, html: str) -> list[tuple[re.Match, str]]:
+	"""
+	`<link rel="stylesheet">` tags of a page that point at a stylesheet in the output, along with the
+	output-relative path of the stylesheet.
+	"""
+	links = []
+	for match in _TAG.finditer(html):
+		if match.group(1).lower() != "link":
+			continue
+		attributes = {
+			name.lower(): next((v for v in values if v), "")
+			for name, *values in _ATTRIBUTE.findall(match.group(2))
+		}
+		if (
+			attributes.get("rel", "").lower() != "stylesheet"
+			or attributes.get("media", "all") != "all"
+		):
+			continue
+		href = _resolve_reference(page, re.split(r"[?#]", attributes.get("href", ""))[0])
+		if href and path.isfile(gen.output_path_for(href)):
+			links.append((match, href))
+	return links
+
+
+def _inline_imports(
+	gen: "SiteGenerator", stylesheet: str, seen: set[str], external: list[str]
+) -> str:
+	"""
+	Contents of a stylesheet in the output with its local `@import`s replaced by the imported files
+	(each file only once), and relative `url()`s made absolute so they work from anywhere.
+	"""
+	if stylesheet in seen:
+		return ""
+	seen.add(stylesheet)
+
+	def absolute(match: re.Match) -> str:
+		prefix, quote, ref = match.groups()
+		if (
+			prefix.startswith("@import")
+			or (resolved := _resolve_reference(stylesheet, ref)) is None
+		):
+			return match.group(0)
+		return f"{prefix}{quote}/{resolved}{quote}"
+
+	def replace_import(match: re.Match) -> str:
+		_quote, ref, media = match.groups()
+		target = _resolve_reference(stylesheet, ref)
+		if target is None or not path.isfile(gen.output_path_for(target)):
+			external.append(match.group(0).strip() + ";")
+			return ""
+		contents = _inline_imports(gen, target, seen, external)
+		media = media.strip()
+		return f"@media {media}{{{contents}}}" if media and media != "all" else contents
+
+	source = _CSS_REFERENCE.sub(absolute, read_file(gen.output_path_for(stylesheet)))
+	return "".join(
+		_IMPORT.sub(replace_import, statement + ";") if is_import else statement
+		for is_import, statement in _statements(source)
+	)
+
+
+@lru_cache(maxsize=1024)
+def _statements(source: str) -> tuple[tuple[bool, str], ...]:
+	"""
+	The top-level statements of a stylesheet, serialized, and whether each is an `@import`. Memoized,
+	as every stylesheet is part of the bundles of many pages, and is bundled again on every build.
+	"""
+	# `@import` statements have to end with a `;`; find them in the parsed tree so ones inside
+	# comments or strings are left alone
+	return tuple(
+		(True, node)
+		if isinstance(node, str) and node[:7].lower() == "@import"
+		else (False, serialize_css([node]))
+		for node in parse_css(source)
+	)
+
+
+def bundle_stylesheets(
+	gen: "SiteGenerator",
+	pages: list[str],
+	keep: list[str],
+	inline_limit: int,
+	output_dir: str,
+) -> int:
+	"""
+	Replaces the stylesheets linked from each page with a single bundle per distinct set of
+	stylesheets, pruned against all pages linking that set. See `SiteGenerator.bundle_css()`.
+
+	# Returns
+	The number of bundles.
+	"""
+	kept = re.compile("|".join(f"(?:{pattern})" for pattern in keep)) if keep else None
+
+	# stylesheets -> [(page, html, start, end, markup)], where html[start:end] is replaced with the
+	# bundle; html is `None` for pages that weren't read, and markup is what they're bundled with now
+	groups: dict[tuple[str, ...], list[tuple[str, str | None, int, int, str | None]]] = {}
+	names: dict[tuple[str, ...], set[tuple[str, str]]] = {}
+	for page in pages:
+		full = gen.output_path_for(page)
+		page_digest = gen._file_digest(full)
+		names_key = digest(str(CACHE_VERSION), "names", page_digest)
+		page_used = gen._css_cache.get(names_key)
+
+		# pages that were bundled before (and not re-rendered since) remember their stylesheets, and
+		# don't have to be read again unless their bundle changes
+		record = gen._css_cache.get(digest(str(CACHE_VERSION), "bundled page", page_digest))
+		html = None if record is not None and page_used is not None else read_file(full)
+		if record is not None:
+			stylesheets, start, end, markup = record
+		else:
+			assert html is not None
+			markup = None
+			links = _stylesheet_links(gen, page, html)
+			if not links:
+				continue
+			stylesheets = tuple(href for _, href in links)
+			# drop all links, the bundle takes the place of the first one
+			for link, _ in reversed(links):
+				html = html[: link.start()] + html[link.end() :]
+			start = end = links[0][0].start()
+
+		if page_used is None:
+			assert html is not None
+			page_used = page_names(html)
+			gen._css_cache.set(names_key, page_used)
+
+		groups.setdefault(stylesheets, []).append((page, html, start, end, markup))
+		names.setdefault(stylesheets, set()).update(page_used)
+
+	for stylesheets, group in groups.items():
+		used_names = names[stylesheets]
+
+		def used(kind: str, name: str) -> bool:
+			return (kind, name) in used_names or (
+				kept is not None and kept.fullmatch(name) is not None
+			)
+
+		external: list[str] = []
+		seen: set[str] = set()
+		source = "".join(
+			_inline_imports(gen, stylesheet, seen, external) for stylesheet in stylesheets
+		)
+		# pruning is by far the slowest part; skip it while neither the stylesheets nor the pages change
+		key = digest(
+			str(CACHE_VERSION),
+			"bundle",
+			gen.profile,
+			repr(keep),
+			repr(sorted(used_names)),
+			"".join(external),
+			source,
+		)
+		if (css := gen._css_cache.get(key)) is None:
+			css = "".join(external) + serialize_css(prune_css(parse_css(source), used))
+			if gen.profile == "prod":
+				css = gen._minify("css", css)
+			gen._css_cache.set(key, css)
+
+		if len(css.encode()) <= inline_limit:
+			markup = f"<style>{css}</style>"
+		else:
+			bundle = fingerprinted_name(
+				posixpath.join(output_dir, "bundle.css"), hashlib.sha256(css.encode()).hexdigest()
+			)
+			gen.write_output(bundle, css)
+			markup = f'<link rel="stylesheet" href="/{bundle}" />'
+
+		for page, html, start, end, bundled in group:
+			if bundled == markup:
+				continue  # bundled with this already
+			full = gen.output_path_for(page)
+			if html is None:
+				html = read_file(full)
+			html = html[:start] + markup + html[end:]
+			write_if_changed(full, html)
+			gen._css_cache.set(
+				digest(
+					str(CACHE_VERSION), "bundled page", hashlib.sha256(html.encode()).hexdigest()
+				),
+				(stylesheets, start, start + len(markup), markup),
+			)
+
+	return len(groups)
@@ -0,0 +1,138 @@
+"""
+Markdown extensions used by `SiteGenerator`. See `_MD_EXTENSIONS` in `sitegen.py`.
+"""
+
+# pyright: reportMissingImports=false, reportMissingModuleSource=false
+import pickle
+import re
+from functools import partial
+from xml.etree.ElementTree import Element
+
+from l2m4m import LaTeX2MathMLExtension, LatexBlockProcessor, LatexPattern
+from latex2mathml import converter
+from pymdownx.highlight import Highlight, HighlightExtension
+
+from .cache import DiskCache, digest
+from .log import span
+from .sitegen import _dist_version, _stable_repr
+
+# caches live as long as the process does, so their in-memory layer survives hot reloads (which create
+# a new `SiteGenerator`, and with it new markdown extensions)
+_caches: dict[tuple[str, str], DiskCache] = {}
+
+
+def _shared_cache(cache_path: str, namespace: str) -> DiskCache:
+	"""Returns the process-wide `DiskCache` for the given directory and namespace."""
+	key = (cache_path, namespace)
+	if key not in _caches:
+		_caches[key] = DiskCache(cache_path, namespace)
+	return _caches[key]
+
+
+class CachedHighlight(Highlight):
+	"""
+	`Highlight` that memoizes highlighted code blocks, keyed on the code, its language, the formatter
+	options and the highlighting arguments. Inline code is cheap and not cached.
+	"""
+
+	def __init__(self, *args, cache: DiskCache, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.cache = cache
+
+	def highlight(self, src, language, css_class="highlight", inline=False, **kwargs):
+		if inline:
+			return super().highlight(src, language, css_class, inline=True, **kwargs)
+
+		# the block number is only used for line ids, and only if the block has no id of its own;
+		# leave it out of the key otherwise, so inserting a block doesn't invalidate all blocks after it
+		if not ((self.line_spans or self.line_anchors) and not kwargs.get("id_value")):
+			kwargs.pop("code_block_count", None)
+
+		options = {k: v for k, v in vars(self).items() if k != "cache"}
+		key = digest(
+			_stable_repr(options),
+			_stable_repr([language, css_class, kwargs]),
+			str(_dist_version("Pygments")),
+			src,
+		)
+		if (code := self.cache.get(key)) is None:
+			with span("highlight", language=language):
+				code = super().highlight(src, language, css_class, **kwargs)
+			self.cache.set(key, code)
+		return code
+
+
+class CachedHighlightExtension(HighlightExtension):
+	"""
+	Drop-in replacement for `pymdownx.highlight` that caches highlighted code blocks in memory and in
+	`cache_path`, so editing the prose of a code-heavy post doesn't run its code through Pygments again.
+	"""
+
+	def __init__(self, *args, cache_path: str = ".solstice-cache", **kwargs):
+		self.cache_path = cache_path
+		super().__init__(*args, **kwargs)
+
+	def get_pymdownx_highlighter(self):
+		return partial(CachedHighlight, cache=_shared_cache(self.cache_path, "highlight"))
+
+
+def _latex_to_mathml(cache: DiskCache, latex: str, display: str) -> Element:
+	"""Converts LaTeX to a MathML element, reusing the result of an earlier conversion if there is one."""
+	key = digest(str(_dist_version("latex2mathml")), display, latex)
+	# elements are mutable, so the cache holds them pickled and every caller gets its own copy
+	if (data := cache.get(key)) is None:
+		with span("mathml", display=display):
+			data = pickle.dumps(converter.convert_to_element(latex, display=display))
+		cache.set(key, data)
+	return pickle.loads(data)
+
+
+class CachedLatexPattern(LatexPattern):
+	def __init__(self, pattern: str, cache: DiskCache):
+		super().__init__(pattern)
+		self.cache = cache
+
+	def handleMatch(self, m):
+		return _latex_to_mathml(self.cache, m.group(2), "inline")
+
+
+class CachedLatexBlockProcessor(LatexBlockProcessor):
+	def __init__(self, parser, cache: DiskCache):
+		super().__init__(parser)
+		self.cache = cache
+
+	def run(self, parent, blocks):
+		# same as `LatexBlockProcessor.run` (quirks included, so the output doesn't change), but cached
+		start = self._RE_LATEX_START[self._mode]
+		end = self._RE_LATEX_END[self._mode]
+
+		for i, block in enumerate(blocks):
+			if not re.search(start, block):
+				continue
+
+			text = "\n".join([blocks.pop(j) for j in range(0, i + 1)])
+			text = re.sub(start, "", text)
+			text = re.sub(end, "", text)
+
+			parent.append(_latex_to_mathml(self.cache, text, "block"))
+			return True
+
+		return False
+
+
+class CachedLaTeX2MathMLExtension(LaTeX2MathMLExtension):
+	"""
+	Drop-in replacement for `l2m4m`'s LaTeX to MathML extension that caches every converted expression by
+	its source and display mode, in memory and in `cache_path`. The cache is shared by all pages.
+	"""
+
+	def __init__(self, *args, cache_path: str = ".solstice-cache", **kwargs):
+		self.cache_path = cache_path
+		super().__init__(*args, **kwargs)
+
+	def extendMarkdown(self, md):
+		cache = _shared_cache(self.cache_path, "mathml")
+		md.inlinePatterns.register(CachedLatexPattern(self._RE_LATEX, cache), "latex-inline", 170)
+		md.parser.blockprocessors.register(
+			CachedLatexBlockProcessor(md.parser, cache), "latex-block", 170
+		)
@@ -0,0 +1,242 @@
+"""
+Subsets of self-hosted web fonts with just the glyphs a site uses. See `SiteGenerator.subset_fonts()`.
+"""
+
+# pyright: reportMissingImports=false, reportMissingModuleSource=false
+import html
+import os
+import posixpath
+import re
+from os import path
+from typing import TYPE_CHECKING
+
+from .assets import _CSS_REFERENCE, _resolve_reference
+from .cache import digest
+from .log import span
+from .sitegen import (
+	CACHE_VERSION,
+	_dist_version,
+	_transfer_file,
+	read_file,
+	recurse_files,
+	write_if_changed,
+)
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+FONT_EXTENSIONS = [".woff2", ".woff", ".ttf", ".otf"]
+
+# number of hex digits of the cache key that end up in the file name of a subset
+HASH_LENGTH = 8
+
+_FONT_FACE = re.compile(r"@font-face\s*\{[^}]*\}", re.I)
+_TEXT = re.compile(r"<(style|script)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>", re.S | re.I)
+# strings in `content` declarations, i.e. text generated by CSS
+_CSS_CONTENT = re.compile(r"""content\s*:\s*([^;}]*)""", re.I)
+_CSS_STRING = re.compile(r""""((?:\\.|[^"\\])*)"|'((?:\\.|[^'\\])*)'""")
+_FORMAT = re.compile(r"""format\(\s*(["']?)(?:woff|truetype|opentype)\1\s*\)""")
+_CSS_ESCAPE = re.compile(r"\\([0-9a-fA-F]{1,6})\s?|\\(.)")
+
+
+def _css_unescape(text: str) -> str:
+	return _CSS_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)) if m.group(1) else m.group(2), text)
+
+
+def html_text(source: str) -> str:
+	"""The text of an HTML document, as displayed: without tags, scripts and styles, and unescaped."""
+	return html.unescape(_TEXT.sub("", source))
+
+
+def css_text(source: str) -> str:
+	"""The text generated by a stylesheet through `content` declarations, e.g. in `::before`."""
+	return "".join(
+		_css_unescape(a or b)
+		for declaration in _CSS_CONTENT.findall(source)
+		for a, b in _CSS_STRING.findall(declaration)
+	)
+
+
+def _subset(src: str, dest: str, codepoints: list[int]):
+	"""Writes the glyphs of the font at `src` needed for `codepoints`, as WOFF2, to `dest`."""
+	from fontTools import subset
+
+	options = subset.Options()
+	options.flavor = "woff2"
+	# keep ligatures, alternates etc. for the remaining glyphs
+	options.layout_features = ["*"]
+	# FontForge timestamps, which fontTools can't subset and would warn about
+	options.drop_tables += ["FFTM"]
+
+	with span("subset font", src=src, codepoints=len(codepoints)):
+		font = subset.load_font(src, options)
+		subsetter = subset.Subsetter(options)
+		subsetter.populate(unicodes=codepoints)
+		subsetter.subset(font)
+
+		os.makedirs(path.dirname(dest), exist_ok=True)
+		tmp = f"{dest}.{os.getpid()}.tmp"
+		try:
+			subset.save_font(font, tmp, options)
+			os.replace(tmp, dest)
+		finally:
+			if path.lexists(tmp):
+				os.remove(tmp)
+
+
+def _rewrite_key(gen: "SiteGenerator", stylesheet: str) -> str:
+	"""Cache key for a rewrite of the copied `stylesheet`, by its current contents in the output."""
+	full = gen.output_path_for(stylesheet)
+	return digest(str(CACHE_VERSION), "rewritten", gen.profile, stylesheet, gen._file_digest(full))
+
+
+def rewritten_stylesheets(gen: "SiteGenerator", dir: str) -> set[str]:
+	"""
+	Stylesheets copied from `dir` (see `SiteGenerator.copy()`) that the last build pointed at font
+	subsets, and whose sources didn't change since. Those are left as they are instead of being copied
+	and rewritten again, and the subsets they point at are kept.
+
+	# Returns
+	The paths of the stylesheets, relative to `dir`.
+	"""
+	rewritten = set()
+	for name, (source, _hash) in gen._previous_manifest().items():
+		if (
+			source != name
+			or not name.startswith(dir + "/")
+			or not name.endswith(".css")
+			or not path.isfile(name)
+			or not path.isfile(gen.output_path_for(name))
+		):
+			continue
+		record = gen._font_cache.get(_rewrite_key(gen, name))
+		if record is not None and record[0] == gen._file_digest(name):
+			rewritten.add(posixpath.relpath(name, dir))
+			for subset in record[1]:
+				gen._keep_outputs(subset)
+	return rewritten
+
+
+def subset_stylesheet_fonts(
+	gen: "SiteGenerator",
+	pages: list[str],
+	text_files: list[str],
+	output_dir: str,
+) -> dict[str, str]:
+	"""
+	Writes subsets of the fonts referenced by the `@font-face` rules of all stylesheets in the output,
+	with the characters used in `pages`, `text_files` and generated content in stylesheets, and points
+	the rules at them. Subsets are cached by the contents of the font and the set of characters, so
+	each one is only made once.
+
+	# Returns
+	A mapping from every subset font to its subset, as output-relative paths.
+	"""
+	prefix = posixpath.normpath(output_dir) + "/"
+	stylesheets = [
+		path.relpath(path.join(dirname, file), gen.output_path).replace(os.sep, "/")
+		for dirname, file, _, _ in recurse_files(gen.output_path, [".css"])
+	]
+
+	# characters are cached per file by content, so only changed files are read again
+	files = [(gen.output_path_for(name), html_text) for name in pages]
+	files += [(gen.output_path_for(name), css_text) for name in stylesheets]
+	files += [(name, str) for name in text_files]
+	chars: set[str] = set()
+	for full, extract in files:
+		key = digest(str(CACHE_VERSION), "chars", extract.__name__, gen._file_digest(full))
+		if (file_chars := gen._font_cache.get(key)) is None:
+			file_chars = "".join(sorted(set(extract(read_file(full)))))
+			gen._font_cache.set(key, file_chars)
+		chars.update(file_chars)
+	# whitespace and control characters aren't drawn from the font, except for the regular space
+	codepoints = sorted(ord(c) for c in chars if c == " " or (not c.isspace() and c.isprintable()))
+
+	# stylesheets that weren't copied again since the last build point at subsets already; subset the
+	# original fonts again, as the characters may have changed
+	originals = {
+		name: source
+		for name, (source, _hash) in gen._previous_manifest().items()
+		if name.startswith(prefix) and source is not None
+	}
+
+	def font_of(stylesheet: str, ref: str) -> str | None:
+		font = _resolve_reference(stylesheet, ref)
+		if font is not None:
+			font = originals.get(font, font)
+		if (
+			font is None
+			or font.startswith(prefix)  # a subset of a font that is gone
+			or posixpath.splitext(font)[1] not in FONT_EXTENSIONS
+			or not path.isfile(gen.output_path_for(font))
+		):
+			return None
+		return font
+
+	# fingerprinted copies are cached forever, so only their originals are rewritten, and fingerprinted
+	# again under new names afterwards
+	fingerprinted = set(gen._assets.values())
+	rewritten = [stylesheet for stylesheet in stylesheets if stylesheet not in fingerprinted]
+	fonts = sorted(
+		{
+			font
+			for stylesheet in rewritten
+			for rule in _FONT_FACE.findall(read_file(gen.output_path_for(stylesheet)))
+			for _, _, ref in _CSS_REFERENCE.findall(rule)
+			if (font := font_of(stylesheet, ref)) is not None
+		}
+	)
+
+	cache_dir = path.join(gen.cache_path, "fonts")
+	fonttools = str(_dist_version("fonttools"))
+	subsets = {}
+	for font in fonts:
+		key = digest(
+			str(CACHE_VERSION),
+			gen._file_digest(gen.output_path_for(font)),
+			repr(codepoints),
+			fonttools,
+		)
+		cached = path.join(cache_dir, key[:2], f"{key}.woff2")
+		# fontTools is pure Python, so threads wouldn't help; sites rarely have more than a few fonts
+		if not path.exists(cached):
+			_subset(gen.output_path_for(font), cached, codepoints)
+
+		base = posixpath.splitext(posixpath.basename(font))[0]
+		subset = posixpath.join(prefix, f"{base}.{key[:HASH_LENGTH]}.woff2")
+		dest = gen.output_path_for(subset)
+		if not path.exists(dest):
+			os.makedirs(path.dirname(dest), exist_ok=True)
+			_transfer_file(cached, dest, "hardlink")
+		gen._record_output(subset, font)
+		subsets[font] = subset
+
+	# point the `@font-face` rules at the subsets
+	for stylesheet in rewritten:
+		used = set()
+
+		def rewrite_url(ref: re.Match) -> str:
+			head, quote, url = ref.groups()
+			font = font_of(stylesheet, url)
+			if font is None:
+				return ref.group(0)
+			used.add(subsets[font])
+			return f"{head}{quote}/{subsets[font]}{quote}"
+
+		def rewrite_rule(rule: re.Match) -> str:
+			# the subsets are always WOFF2
+			return _FORMAT.sub('format("woff2")', _CSS_REFERENCE.sub(rewrite_url, rule.group(0)))
+
+		full = gen.output_path_for(stylesheet)
+		write_if_changed(full, _FONT_FACE.sub(rewrite_rule, read_file(full)))
+		# remember the rewrite of copied stylesheets, for `copy()` to leave them alone next time
+		if used and path.isfile(stylesheet):
+			key, record = (
+				_rewrite_key(gen, stylesheet),
+				(gen._file_digest(stylesheet), sorted(used)),
+			)
+			if gen._font_cache.get(key) != record:
+				gen._font_cache.set(key, record)
+	gen._refingerprint_stylesheets()
+
+	return subsets
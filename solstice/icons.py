@@ -0,0 +1,82 @@
+"""
+SVG icons collected into a single sprite, referenced from pages with `<use>`. See
+`SiteGenerator.icons()` and `SiteGenerator.icon()`.
+"""
+
+import re
+from html import escape
+
+_SVG = re.compile(r"<svg\b([^>]*)>(.*)</svg>", re.S | re.I)
+_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*"([^"]*)"')
+_XML_DECLARATION = re.compile(r"<\?xml.*?\?>|<!DOCTYPE[^>]*>", re.S | re.I)
+
+# attributes of an icon's root element that belong on the `<svg>` in the page rather than on the
+# `<symbol>` in the sprite, as they size and identify the element in the page
+_ELEMENT_ATTRIBUTES = {"width", "height", "class", "id", "x", "y", "style"}
+_DROPPED_ATTRIBUTES = {"xmlns", "version"}
+
+
+def _attributes(markup: str) -> dict[str, str]:
+	return dict(_ATTRIBUTE.findall(markup))
+
+
+def _render_attributes(attributes: dict[str, str]) -> str:
+	return "".join(f' {name}="{escape(value)}"' for name, value in attributes.items())
+
+
+def parse_icon(source: str) -> tuple[dict[str, str], dict[str, str], str]:
+	"""
+	Splits an SVG file into the attributes for the `<svg>` element in the page, the attributes for its
+	`<symbol>` in the sprite, and the contents. Comments before the root element (e.g. license notices)
+	are moved into the contents, so they end up in the sprite.
+	"""
+	source = _XML_DECLARATION.sub("", source)
+	match = _SVG.search(source)
+	if match is None:
+		raise ValueError("not an SVG file")
+	element: dict[str, str] = {}
+	symbol: dict[str, str] = {}
+	for name, value in _attributes(match.group(1)).items():
+		if name in _DROPPED_ATTRIBUTES or name.startswith("xmlns:"):
+			continue
+		elif name in _ELEMENT_ATTRIBUTES:
+			element[name] = value
+		else:
+			symbol[name] = value
+	# the page's `<svg>` needs the view box too, for the icon's aspect ratio
+	if "viewBox" in symbol:
+		element["viewBox"] = symbol["viewBox"]
+	contents = source[: match.start()].strip() + match.group(2).strip()
+	return element, symbol, contents
+
+
+def build_sprite(icons: dict[str, str]) -> tuple[str, dict[str, dict[str, str]]]:
+	"""
+	Builds a sprite with a `<symbol>` for each of the given icons (name -> SVG source).
+
+	# Returns
+	The sprite, and the attributes for the `<svg>` element in the page of every icon.
+	"""
+	symbols = []
+	elements = {}
+	for name, source in sorted(icons.items()):
+		element, symbol, contents = parse_icon(source)
+		symbols.append(
+			f"<symbol{_render_attributes({'id': symbol_id(name)} | symbol)}>{contents}</symbol>"
+		)
+		elements[name] = element
+	sprite = f'<svg xmlns="http://www.w3.org/2000/svg">{"".join(symbols)}</svg>\n'
+	return sprite, elements
+
+
+def symbol_id(name: str) -> str:
+	"""The id of an icon's `<symbol>` in the sprite, e.g. `brands-github` for `brands/github`."""
+	return re.sub(r"[^\w-]", "-", name)
+
+
+def icon_markup(name: str, url: str, element: dict[str, str], attributes: dict[str, str]) -> str:
+	"""An `<svg>` element that shows the icon `name` from the sprite at `url`."""
+	attributes = {"xmlns": "http://www.w3.org/2000/svg"} | element | attributes
+	return (
+		f'<svg{_render_attributes(attributes)}><use href="{escape(url)}#{symbol_id(name)}" /></svg>'
+	)
@@ -0,0 +1,165 @@
+"""
+Resized, re-encoded variants of raster images for responsive `<picture>` markup. See
+`SiteGenerator.images()` and `SiteGenerator.responsive_images()`.
+"""
+
+# pyright: reportMissingImports=false, reportMissingModuleSource=false
+import os
+import posixpath
+import re
+from html import escape
+from os import path
+from typing import TYPE_CHECKING, Any
+
+from .cache import digest
+from .log import span
+from .sitegen import CACHE_VERSION, _dist_version, _transfer_file, recurse_files
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+RASTER_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+
+# number of hex digits of the cache key that end up in the file name of a variant
+HASH_LENGTH = 8
+
+_MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+# the slot of an image is the full width of the layout unless told otherwise, as in browsers
+DEFAULT_SIZES = "100vw"
+
+_IMG_TAG = re.compile(r"<img\s([^>]*?)\s*/?>")
+_ATTRIBUTE = re.compile(r'([\w:-]+)="([^"]*)"')
+
+
+def _image_size(filename: str) -> tuple[int, int]:
+	"""Size of an image as displayed, i.e. taking EXIF orientation into account. Only reads the header."""
+	from PIL import Image
+
+	with Image.open(filename) as image:
+		width, height = image.size
+		# orientations 5-8 are rotated by 90 degrees
+		if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+			width, height = height, width
+	return width, height
+
+
+def _encode(src: str, dest: str, width: int, format: str, quality: int):
+	"""Writes `src` scaled down to `width` pixels wide, encoded as `format`, to `dest`."""
+	from PIL import Image, ImageOps
+
+	with span("encode image", src=src, width=width, format=format):
+		with Image.open(src) as image:
+			# the EXIF data doesn't survive re-encoding, so apply the orientation it specifies
+			image = ImageOps.exif_transpose(image)
+			if image.mode not in ("RGB", "RGBA"):
+				transparent = "A" in image.mode or "transparency" in image.info
+				image = image.convert("RGBA" if transparent else "RGB")
+			if width < image.width:
+				height = round(image.height * width / image.width)
+				image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+			os.makedirs(path.dirname(dest), exist_ok=True)
+			tmp = f"{dest}.{os.getpid()}.tmp"
+			try:
+				image.save(tmp, format=format.upper(), quality=quality)
+				os.replace(tmp, dest)
+			finally:
+				if path.lexists(tmp):
+					os.remove(tmp)
+
+
+def generate_variants(
+	gen: "SiteGenerator",
+	dir: str,
+	output_dir: str,
+	widths: list[int],
+	formats: list[str],
+	quality: int,
+) -> dict[str, dict[str, Any]]:
+	"""
+	Makes sure every variant of every raster image in `dir` exists in the output directory, encoding
+	the ones that aren't in the cache yet. Variants are cached by the contents of their source image and
+	the encoding settings, so an image is only ever encoded once.
+
+	# Returns
+	A mapping from the URL of every image to its size and the URLs and widths of its variants, by format.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	cache_dir = path.join(gen.cache_path, "images")
+	pillow = str(_dist_version("pillow"))
+	encode = {}
+	links = []
+	registry = {}
+
+	for dirname, file, _, _ in recurse_files(dir, RASTER_EXTENSIONS):
+		src = path.join(dirname, file)
+		url = "/" + path.normpath(src).replace(os.sep, "/")
+		src_digest = gen._file_digest(src)
+
+		size_key = digest(str(CACHE_VERSION), "size", src_digest)
+		if (size := gen._image_cache.get(size_key)) is None:
+			size = _image_size(src)
+			gen._image_cache.set(size_key, size)
+
+		base = posixpath.join(output_dir, posixpath.splitext(url.lstrip("/"))[0])
+		targets = sorted({min(width, size[0]) for width in widths})
+		variants: dict[str, list[tuple[str, int]]] = {}
+		for format in formats:
+			for width in targets:
+				key = digest(
+					str(CACHE_VERSION), src_digest, format, str(width), str(quality), pillow
+				)
+				cached = path.join(cache_dir, key[:2], f"{key}.{format}")
+				variant = f"{base}.{width}w.{key[:HASH_LENGTH]}.{format}"
+				if not path.exists(cached):
+					encode[cached] = (src, cached, width, format, quality)
+				links.append((cached, variant, src))
+				variants.setdefault(format, []).append(("/" + variant, width))
+
+		registry[url] = {"width": size[0], "height": size[1], "variants": variants}
+
+	if encode:
+		# Pillow releases the GIL while resizing and encoding, so threads are enough
+		with ThreadPoolExecutor() as pool:
+			# list() to propagate exceptions
+			list(pool.map(lambda job: _encode(*job), encode.values()))
+
+	for cached, variant, src in links:
+		dest = gen.output_path_for(variant)
+		if not path.exists(dest):
+			_transfer_file(cached, dest, "hardlink")
+		gen._record_output(variant, src)
+
+	return registry
+
+
+def picture_markup(html: str, registry: dict[str, dict[str, Any]], sizes: str | None = None) -> str:
+	"""
+	Replaces every `<img>` tag in `html` that shows an image from `registry` with a `<picture>` element
+	offering its variants. The `<img>` itself is kept as the fallback for browsers that support none of
+	the formats.
+
+	The `sizes` attribute of the sources is `sizes` if given, otherwise the one the image was
+	registered with, otherwise `DEFAULT_SIZES`.
+	"""
+
+	def replace(match: re.Match) -> str:
+		attributes = dict(_ATTRIBUTE.findall(match.group(1)))
+		image = registry.get(attributes.get("src", ""))
+		if image is None:
+			return match.group(0)
+
+		slot = escape(sizes or image.get("sizes") or DEFAULT_SIZES)
+		sources = "".join(
+			f'<source type="{_MIME_TYPES[format]}" sizes="{slot}" srcset="'
+			+ ", ".join(f"{escape(url)} {width}w" for url, width in variants)
+			+ '" />'
+			for format, variants in image["variants"].items()
+		)
+		attributes.setdefault("loading", "lazy")
+		img = " ".join(f'{name}="{value}"' for name, value in attributes.items())
+		return f"<picture>{sources}<img {img} /></picture>"
+
+	return _IMG_TAG.sub(replace, html)
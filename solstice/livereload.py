@@ -0,0 +1,172 @@
+"""
+Live reloading for the development server: after every build, the outputs that changed are pushed to
+open pages over server-sent events. A page reloads itself only when it changed, and swaps its
+stylesheets in place when nothing but those changed. See `solstice.cli`.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+
+# URL the client listens to for changes
+EVENTS_URL = "/_solstice/live"
+
+# number of builds to remember, for clients reconnecting after missing some
+HISTORY_LENGTH = 32
+
+# id of the injected client's `<script>`, which differs with every build (see `inject_client()`)
+CLIENT_ID = "solstice-live"
+
+CLIENT_SCRIPT = """
+(() => {
+	const styles = (doc) => [...doc.querySelectorAll('link[rel="stylesheet"], style')];
+	// contents without the stylesheets, and without this script, which differs with every build
+	const strip = (element) => {
+		element = element.cloneNode(true);
+		styles(element).forEach((style) => style.remove());
+		element.querySelector("#CLIENT_ID")?.remove();
+		return element.innerHTML;
+	};
+	// the page as first rendered, to tell whether a change only affects its stylesheets
+	const initial = strip(document.body);
+	const outputs = () => {
+		const url = decodeURIComponent(location.pathname).slice(1);
+		return url === "" || url.endsWith("/") ? [url + "index.html"] : [url, url + ".html"];
+	};
+
+	// add the new stylesheets next to the old ones and remove those once the new ones loaded, so the
+	// page is never shown unstyled
+	const swap = (old, replacements) => {
+		if (old.length === 0) return;
+		const loaded = replacements.map((element) => {
+			element = document.importNode(element, true);
+			old[old.length - 1].after(element);
+			return element.tagName === "LINK"
+				? new Promise((resolve) => (element.onload = element.onerror = resolve))
+				: Promise.resolve();
+		});
+		Promise.all(loaded).then(() => old.forEach((element) => element.remove()));
+	};
+
+	const update = async (changed) => {
+		if (changed === null) {
+			location.reload();
+			return;
+		}
+		if (outputs().some((name) => changed.includes(name))) {
+			const response = await fetch(location.href, { cache: "no-cache" });
+			const page = new DOMParser().parseFromString(await response.text(), "text/html");
+			if (
+				!response.ok ||
+				styles(document).length === 0 ||
+				strip(page.body) !== initial ||
+				strip(page.head) !== strip(document.head)
+			) {
+				location.reload();
+				return;
+			}
+			swap(styles(document), styles(page));
+			return;
+		}
+
+		const stale = styles(document).filter(
+			(element) => element.href && changed.includes(new URL(element.href).pathname.slice(1)),
+		);
+		swap(
+			stale,
+			stale.map((element) => {
+				const fresh = element.cloneNode();
+				const url = new URL(element.href);
+				url.searchParams.set("live", Date.now());
+				fresh.href = url;
+				return fresh;
+			}),
+		);
+	};
+
+	// changes since the build the page is from; reconnects continue from the last event instead
+	const events = new EventSource("EVENTS_URL?since=" + encodeURIComponent(EVENT_ID));
+	events.onmessage = (event) => update(JSON.parse(event.data).changed);
+})();
+""".replace("EVENTS_URL", EVENTS_URL).replace("CLIENT_ID", CLIENT_ID)
+
+_BODY_END = re.compile(rb"</body\s*>", re.I)
+
+
+def inject_client(html: bytes, event_id: str) -> bytes:
+	"""
+	Adds the live reload client to the end of the body of a page, listening for the changes since the
+	build `event_id` refers to (see `LiveReload.event_id()`).
+	"""
+	client = CLIENT_SCRIPT.replace("EVENT_ID", json.dumps(event_id))
+	script = f'<script id="{CLIENT_ID}">{client}</script>'.encode()
+	matches = list(_BODY_END.finditer(html))
+	if not matches:
+		return html + script
+	end = matches[-1].start()
+	return html[:end] + script + html[end:]
+
+
+class LiveReload:
+	"""
+	Hands the changes of every build to the connections waiting for them. Builds are numbered; the
+	numbers are prefixed with a token unique to this process, so a client that reconnects to a
+	restarted server knows it can't tell what changed in the meantime.
+	"""
+
+	def __init__(self):
+		self.token = os.urandom(4).hex()
+		self.closed = False
+		self._build = 0
+		# (build number, outputs that changed in it)
+		self._history: deque[tuple[int, list[str]]] = deque(maxlen=HISTORY_LENGTH)
+		self._condition = threading.Condition()
+
+	def notify(self, changes: dict[str, list[str]]):
+		"""Publishes the changes of a build session, see `SiteGenerator.build_session()`."""
+		changed = sorted({name for names in changes.values() for name in names})
+		with self._condition:
+			self._build += 1
+			self._history.append((self._build, changed))
+			self._condition.notify_all()
+
+	def close(self):
+		"""Wakes up and ends all waiting connections, e.g. when the server shuts down."""
+		with self._condition:
+			self.closed = True
+			self._condition.notify_all()
+
+	def event_id(self) -> str:
+		"""Identifies the latest build, for `wait()` to tell what changed since."""
+		return f"{self.token}:{self._build}"
+
+	def wait(self, last_event_id: str, timeout: float) -> tuple[str, list[str] | None] | None:
+		"""
+		Waits until there was a build after the one `last_event_id` refers to, or until `timeout`
+		seconds have passed.
+
+		# Returns
+		The id of the latest build and the outputs that changed since `last_event_id`, `None` in place
+		of the outputs if they aren't known (anything may have changed), or `None` on a timeout.
+		"""
+		token, _, build = last_event_id.partition(":")
+		with self._condition:
+			if token != self.token or not build.isdigit() or int(build) > self._build:
+				return self.event_id(), None
+
+			last = int(build)
+			self._condition.wait_for(lambda: self._build > last or self.closed, timeout)
+			if self._build == last:
+				return None
+			if not self._history or self._history[0][0] > last + 1:
+				return self.event_id(), None  # too far behind, some builds are forgotten already
+			changed = sorted(
+				{name for build, names in self._history if build > last for name in names}
+			)
+			return self.event_id(), changed
+
+	@staticmethod
+	def format_event(event_id: str, changed: list[str] | None) -> bytes:
+		return f"id: {event_id}\ndata: {json.dumps({'changed': changed})}\n\n".encode()
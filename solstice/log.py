@@ -1,7 +1,12 @@
 # custom logging implementation bcuz the built-in one kinda sucks
+import json
+import os
 import sys
+import threading
 import time
+from contextlib import contextmanager
 from enum import Enum
+from typing import Any
 
 __all__ = [
 	"LogLevel",
@@ -12,6 +17,9 @@ __all__ = [
 	"success",
 	"warn",
 	"error",
+	"span",
+	"start_trace",
+	"write_trace",
 ]
 
 
@@ -32,7 +40,18 @@ ANSI_COLORS = {
 }
 
 
+# when set, log messages are collected here instead of being printed; see `capture_logs()`.
+# finished spans are collected too, with `None` as their level
+_captured: list[tuple[LogLevel | None, Any]] | None = None
+
+# when set, finished spans are collected here as Chrome trace events; see `start_trace()`
+_trace: list[dict[str, Any]] | None = None
+
+
 def log(level: LogLevel, msg: str):
+	if _captured is not None:
+		_captured.append((level, msg))
+		return
 	# the standard string padding functions don't work as they don't take into account ANSI codes
 	print(
 		f"[{ANSI_COLORS[level]}{level.name}\x1b[0m]" + " " * (8 - len(level.name)) + msg,
@@ -60,6 +79,96 @@ def error(msg: str):
 	log(LogLevel.ERROR, msg)
 
 
+@contextmanager
+def capture_logs():
+	"""
+	Collect all log messages emitted inside the `with` block into a list instead of printing them.
+	Used by worker processes, so their output can be replayed in order by the main process.
+	"""
+	global _captured
+	outer, _captured = _captured, []
+	try:
+		yield _captured
+	finally:
+		_captured = outer
+
+
+def replay_logs(records: list[tuple[LogLevel | None, Any]]):
+	"""Print log messages that were collected with `capture_logs()`, and add their spans to the trace."""
+	for level, msg in records:
+		if level is None:
+			_add_span(msg)
+		else:
+			log(level, msg)
+
+
+def _add_span(event: dict[str, Any]):
+	if _captured is not None:
+		_captured.append((None, event))
+	elif _trace is not None:
+		_trace.append(event)
+
+
+@contextmanager
+def span(name: str, **args: Any):
+	"""
+	Record the time spent inside the `with` block as a span, if tracing is enabled (see `start_trace()`).
+	Spans opened inside other spans are shown nested in the trace. Keyword arguments are shown as
+	details of the span, so they should be small and JSON-serializable.
+
+	Spans recorded in worker processes are captured along with their logs, and end up in the trace once
+	the logs are replayed by the main process.
+
+	# Example
+	```python
+	with span("render", template="blog.jinja"):
+		with span("markdown"):
+			html = convert(source)
+		...
+	```
+	"""
+	if _trace is None and _captured is None:
+		yield
+		return
+	start = time.perf_counter_ns()
+	try:
+		yield
+	finally:
+		end = time.perf_counter_ns()
+		# `perf_counter` is system-wide on the platforms we care about, so spans from workers line up
+		_add_span(
+			{
+				"name": name,
+				"ph": "X",
+				"ts": start / 1000,
+				"dur": (end - start) / 1000,
+				"pid": os.getpid(),
+				"tid": threading.get_native_id(),
+				"args": args,
+			}
+		)
+
+
+def start_trace():
+	"""Start recording spans, discarding any spans recorded before."""
+	global _trace
+	_trace = []
+
+
+def write_trace(filename: str):
+	"""
+	Write all spans recorded since `start_trace()` to `filename` in the Chrome trace event format, which
+	can be viewed in e.g. https://ui.perfetto.dev or `about:tracing` in Chromium.
+	"""
+	events = list(_trace or [])
+	# name the processes, so worker processes are distinguishable from the main one
+	for pid in sorted({event["pid"] for event in events}):
+		name = "solstice" if pid == os.getpid() else f"worker {pid}"
+		events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+	with open(filename, "w") as file:
+		json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
 class LogTimer:
 	def __init__(self, initial_msg: str, ending_msg: str = "Completed in {}"):
 		self.initial_msg = initial_msg
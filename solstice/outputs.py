@@ -0,0 +1,146 @@
+"""
+Backends that the outputs of a build are published to at the end of every build session. See
+`SiteGenerator.output_backend`.
+"""
+
+import os
+import posixpath
+from abc import ABC, abstractmethod
+from os import path
+from typing import TYPE_CHECKING
+
+from .log import span
+
+if TYPE_CHECKING:
+	from .sitegen import SiteGenerator
+
+# output path -> (source, content digest), as recorded by `SiteGenerator.build_session()`
+Manifest = dict[str, tuple[str | None, str]]
+
+# formats that are compressed already; deflating them again only costs time
+_COMPRESSED_EXTENSIONS = {
+	".png",
+	".jpg",
+	".jpeg",
+	".webp",
+	".avif",
+	".gif",
+	".woff",
+	".woff2",
+	".gz",
+	".br",
+	".zst",
+	".zip",
+	".pdf",
+}
+
+
+class OutputBackend(ABC):
+	"""
+	Receives the outputs of every completed build session. Pages and assets are always built in the
+	output directory first, since incremental builds compare against (and post-processing steps like
+	`SiteGenerator.bundle_css()` read) the previous outputs there; a backend decides what is done with
+	the finished site, reading it from there.
+	"""
+
+	@abstractmethod
+	def publish(self, gen: "SiteGenerator", manifest: Manifest):
+		"""
+		Called with the manifest of a build session once it has finished successfully, after outputs
+		that weren't produced again have been removed.
+		"""
+
+
+class FilesystemOutput(OutputBackend):
+	"""The output directory is the site; nothing else happens. This is the default."""
+
+	def publish(self, gen: "SiteGenerator", manifest: Manifest):
+		pass
+
+
+class ArchiveOutput(OutputBackend):
+	"""
+	Packs the whole site into a single archive after every build, e.g. as a deploy artifact. The format
+	follows the file name: `.zip`, `.tar`, `.tar.gz`/`.tgz` or `.tar.xz`. Files and their directories
+	are added in a stable order with their permissions, as regular files (hardlinks are resolved) and
+	without owner information.
+
+	Like every backend, this reads the finished site back from the output directory; for GitHub Pages,
+	`actions/upload-pages-artifact` does the same for the output directory itself.
+
+	# Example
+	```python
+	ssg = solstice.SiteGenerator(output_backend=ArchiveOutput("dist/site.tar"))
+	```
+	"""
+
+	def __init__(self, archive_path: str):
+		self.archive_path = archive_path
+
+	def publish(self, gen: "SiteGenerator", manifest: Manifest):
+		dirname = path.dirname(self.archive_path)
+		if dirname:
+			os.makedirs(dirname, exist_ok=True)
+		tmp = f"{self.archive_path}.{os.getpid()}.tmp"
+		names = sorted(manifest)
+		try:
+			with span("archive outputs", archive=self.archive_path, files=len(names)):
+				if self.archive_path.endswith(".zip"):
+					self._write_zip(gen, names, tmp)
+				else:
+					self._write_tar(gen, names, tmp)
+			os.replace(tmp, self.archive_path)
+		finally:
+			if path.lexists(tmp):
+				os.remove(tmp)
+
+	def _write_zip(self, gen: "SiteGenerator", names: list[str], dest: str):
+		import zipfile
+
+		with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as archive:
+			for name in _with_directories(names):
+				stored = path.splitext(name)[1] in _COMPRESSED_EXTENSIONS
+				archive.write(
+					path.join(gen.output_path, name),
+					name,
+					compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED,
+				)
+
+	def _write_tar(self, gen: "SiteGenerator", names: list[str], dest: str):
+		import tarfile
+
+		if self.archive_path.endswith((".tar.gz", ".tgz")):
+			mode = "w:gz"
+		elif self.archive_path.endswith(".tar.xz"):
+			mode = "w:xz"
+		elif self.archive_path.endswith(".tar"):
+			mode = "w"
+		else:
+			raise ValueError(f"unknown archive format: {self.archive_path}")
+
+		with tarfile.open(dest, mode) as archive:
+			for name in _with_directories(names):
+				full = path.join(gen.output_path, name)
+				info = archive.gettarinfo(full, name)
+				info.uid = info.gid = 0
+				info.uname = info.gname = ""
+				if info.isdir():
+					archive.addfile(info)
+					continue
+				if info.islnk():
+					# e.g. fingerprinted copies are hardlinks; store every file in full
+					info.type = tarfile.REGTYPE
+					info.size = os.stat(full).st_size
+				with open(full, "rb") as file:
+					archive.addfile(info, file)
+
+
+def _with_directories(names: list[str]) -> list[str]:
+	"""Sorted `names` along with all the directories they are in, each directory before its contents."""
+	dirs = {posixpath.dirname(name) for name in names}
+	for dir in list(dirs):
+		while dir:
+			dirs.add(dir)
+			dir = posixpath.dirname(dir)
+	dirs.discard("")
+	return sorted([*names, *dirs])
@@ -1,18 +1,71 @@
 # pyright: reportMissingImports=false, reportMissingModuleSource=false
+import hashlib
+import json
 import os
+import pickle
+import posixpath
+import re
 import shutil
+from contextlib import contextmanager
+from functools import cache, cached_property
 from os import path
-from typing import Any, Literal
-
-import frontmatter
-import jinja2
-import markdown
-from l2m4m import LaTeX2MathMLExtension
-from pymdownx.emoji import EmojiExtension
-from pymdownx.emoji import to_alt as emoji_to_alt
-from pymdownx.highlight import HighlightExtension
-
-from .log import LogTimer, warn
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Literal
+
+from .cache import DiskCache, digest
+from .log import LogTimer, capture_logs, debug, info, replay_logs, span, warn
+from .outputs import FilesystemOutput, OutputBackend
+
+# the markdown and templating libraries are slow to import, and commands like `clean` never need them,
+# so they are imported on first use instead
+if TYPE_CHECKING:
+	import markdown
+	from markupsafe import Markup
+
+	from .templating import TrackingEnvironment
+
+# bump this whenever the format of cached data changes, so stale caches are ignored
+CACHE_VERSION = 2
+
+# name of the file in the output directory that maps assets to their fingerprinted copies
+ASSET_MANIFEST = "asset-manifest.json"
+
+# suffixes of the precompressed copies of outputs written by release builds, see `solstice.compress`
+PRECOMPRESSED_SUFFIXES = (".gz", ".br", ".zst")
+
+# options passed to minify_html in the prod profile
+_MINIFY_OPTIONS = {
+	"minify_css": True,
+	"minify_js": True,
+	"keep_html_and_head_opening_tags": True,
+}
+
+# markdown extensions and their configuration. this is plain data (the emoji generator is referenced by
+# name) so the cache key for converted markdown can be computed without importing any extension
+_MD_EXTENSIONS: list[tuple[str, dict[str, Any]]] = [
+	("admonition", {}),
+	("pymdownx.extra", {}),
+	("pymdownx.tilde", {}),
+	("toc", {}),
+	("pymdownx.emoji", {"emoji_generator": "to_alt"}),
+	# `pymdownx.highlight` with a cache for highlighted code blocks
+	("solstice.extensions:CachedHighlightExtension", {"css_class": "codehilite", "linenums": True}),
+	# `l2m4m` with a cache for converted formulas
+	("solstice.extensions:CachedLaTeX2MathMLExtension", {}),
+]
+
+# distributions whose output ends up in the converted markdown; their versions are part of the cache key
+_MD_DISTRIBUTIONS = [
+	"Markdown",
+	"pymdown-extensions",
+	"L2M4M",
+	"latex2mathml",
+	"Pygments",
+	"python-frontmatter",
+	"PyYAML",
+]
+
+# line that starts or ends YAML frontmatter
+_FRONTMATTER_BOUNDARY = re.compile(r"-{3,}\s*")
 
 
 def filename_to_html(name: str) -> str:
@@ -26,6 +79,111 @@ def read_file(path: str) -> str:
 		return file.read()
 
 
+def write_if_changed(dest: str, data: str | bytes) -> bool:
+	"""
+	Write `data` to `dest`, unless the file already has exactly these contents. Strings are encoded as UTF-8.
+
+	Changed files are written to a temporary file first and then renamed into place, so readers never see
+	a half-written file. Unchanged files are left alone entirely, keeping their modification time.
+
+	# Returns
+	`True` if the file was written, `False` if it was already up to date.
+	"""
+	if isinstance(data, str):
+		data = data.encode()
+
+	try:
+		if os.stat(dest).st_size == len(data):
+			with open(dest, "rb") as file:
+				if file.read() == data:
+					return False
+	except FileNotFoundError:
+		pass
+
+	tmp = f"{dest}.{os.getpid()}.tmp"
+	try:
+		with open(tmp, "wb") as file:
+			file.write(data)
+		os.replace(tmp, dest)
+	finally:
+		if path.lexists(tmp):
+			os.remove(tmp)
+	return True
+
+
+def write_chunks_if_changed(
+	dest: str, chunks: Iterable[str | bytes], buffer_size: int = 1 << 16
+) -> bool:
+	"""
+	Like `write_if_changed()`, but for data that is produced in chunks, e.g. by `render_chunks()`.
+	Chunks are collected into buffers of about `buffer_size` bytes, which a background thread writes
+	to a temporary file while the next buffer is being produced, so memory use stays bounded no matter
+	how large the file gets. The data is hashed along the way and compared against the existing file
+	once it's complete; if they're the same, the existing file is left alone.
+
+	# Returns
+	`True` if the file was written, `False` if it was already up to date.
+	"""
+	import queue
+	import threading
+
+	hasher = hashlib.sha256()
+	size = 0
+	# a few buffers of slack, so neither side waits for the other on every chunk
+	buffers: queue.Queue[bytes | None] = queue.Queue(maxsize=4)
+	errors: list[BaseException] = []
+
+	def writer(file):
+		while (data := buffers.get()) is not None:
+			if not errors:
+				try:
+					file.write(data)
+				except BaseException as e:
+					errors.append(e)  # keep draining, so the producer never blocks on a full queue
+
+	def flush(pending: list[bytes]):
+		nonlocal size
+		data = b"".join(pending)
+		hasher.update(data)
+		size += len(data)
+		buffers.put(data)
+		pending.clear()
+
+	tmp = f"{dest}.{os.getpid()}.tmp"
+	try:
+		with open(tmp, "wb") as file:
+			thread = threading.Thread(target=writer, args=(file,), daemon=True)
+			thread.start()
+			try:
+				pending: list[bytes] = []
+				pending_size = 0
+				for chunk in chunks:
+					if isinstance(chunk, str):
+						chunk = chunk.encode()
+					pending.append(chunk)
+					pending_size += len(chunk)
+					if pending_size >= buffer_size:
+						flush(pending)
+						pending_size = 0
+				flush(pending)
+			finally:
+				buffers.put(None)
+				thread.join()
+			if errors:
+				raise errors[0]
+
+		try:
+			if os.stat(dest).st_size == size and _file_digest(dest) == hasher.hexdigest():
+				return False
+		except FileNotFoundError:
+			pass
+		os.replace(tmp, dest)
+	finally:
+		if path.lexists(tmp):
+			os.remove(tmp)
+	return True
+
+
 def recurse_files(root: str, extensions: list[str]):
 	"""
 	Recursively find files in a directory with specified extensions.
@@ -45,6 +203,200 @@ def recurse_files(root: str, extensions: list[str]):
 			yield (dirname, file, name, ext)
 
 
+def _file_digest(filename: str) -> str:
+	with open(filename, "rb") as file:
+		return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def _transfer_file(src: str, dst: str, mode: str):
+	"""
+	Transfer a single file into place. The file is first created under a temporary name and then
+	renamed over the destination, so a hardlinked destination is never written through.
+	"""
+	tmp = f"{dst}.{os.getpid()}.tmp"
+	try:
+		if mode == "hardlink":
+			try:
+				os.link(src, tmp)
+				os.replace(tmp, dst)
+				return
+			except OSError:
+				pass  # e.g. different filesystems, fall back to a copy
+		elif mode == "reflink":
+			import fcntl
+
+			FICLONE = 0x40049409
+			try:
+				with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+					fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+				shutil.copystat(src, tmp)
+				os.replace(tmp, dst)
+				return
+			except OSError:
+				pass  # filesystem without copy-on-write support, fall back to a copy
+
+		shutil.copy2(src, tmp)
+		os.replace(tmp, dst)
+	finally:
+		if path.lexists(tmp):
+			os.remove(tmp)
+
+
+def sync_tree(
+	src: str,
+	dst: str,
+	mode: Literal["copy", "hardlink", "reflink"] = "copy",
+	checksum: bool = False,
+	transforms: dict[str, Callable[[str], str]] | None = None,
+	keep: set[str] | None = None,
+	rewritten: set[str] | None = None,
+) -> tuple[int, int]:
+	"""
+	Make `dst` an exact mirror of `src`, transferring only files that changed.
+
+	# Arguments
+	- `src`: The directory to mirror.
+	- `dst`: The directory to mirror into. Created if it doesn't exist.
+	- `mode`: `"copy"`, `"hardlink"` or `"reflink"`; see `SiteGenerator.copy()`.
+	- `checksum`: Compare the contents of files with equal sizes instead of their modification times.
+	- `transforms`: Maps file extensions to functions that rewrite the (text) contents of matching
+	  files, e.g. to minify them. Transformed files are compared by their resulting contents.
+	- `keep`: Paths relative to `dst` that should not be removed even though they aren't in `src`.
+	- `rewritten`: Paths relative to `dst` of files that were rewritten in place since the last sync
+	  (e.g. by `SiteGenerator.subset_fonts()`) and are still up to date; these are left alone.
+
+	# Returns
+	The number of files transferred and the number of stale files removed from `dst`.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	transforms = transforms or {}
+	keep = {path.normpath(p) for p in keep or ()}
+	rewritten = {path.normpath(p) for p in rewritten or ()}
+	wanted_files = set()
+	wanted_dirs = set()
+	pending = []
+	transformed = 0
+
+	for dirname, _dirs, files in os.walk(src, followlinks=True):
+		rel_dir = path.relpath(dirname, src)
+		wanted_dirs.add(path.normpath(rel_dir))
+		os.makedirs(path.join(dst, rel_dir), exist_ok=True)
+
+		for file in files:
+			rel = path.normpath(path.join(rel_dir, file))
+			wanted_files.add(rel)
+			if rel in rewritten:
+				continue
+			src_file, dst_file = path.join(src, rel), path.join(dst, rel)
+
+			if transform := transforms.get(path.splitext(file)[1]):
+				transformed += write_if_changed(dst_file, transform(read_file(src_file)))
+				continue
+
+			src_stat = os.stat(src_file)
+			try:
+				dst_stat = os.stat(dst_file)
+			except FileNotFoundError:
+				pending.append((src_file, dst_file))
+				continue
+
+			if mode == "hardlink" and path.samestat(src_stat, dst_stat):
+				continue
+			if src_stat.st_size != dst_stat.st_size:
+				pending.append((src_file, dst_file))
+			elif checksum:
+				if _file_digest(src_file) == _file_digest(dst_file):
+					# same contents; sync the timestamps so the next comparison is cheap again
+					os.utime(dst_file, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+				else:
+					pending.append((src_file, dst_file))
+			elif src_stat.st_mtime_ns != dst_stat.st_mtime_ns:
+				pending.append((src_file, dst_file))
+
+	if pending:
+		with ThreadPoolExecutor() as pool:
+			# list() to propagate exceptions
+			list(pool.map(lambda job: _transfer_file(*job, mode), pending))
+
+	removed = 0
+	for dirname, dirs, files in os.walk(dst, topdown=False):
+		rel_dir = path.relpath(dirname, dst)
+		for file in files:
+			rel = path.normpath(path.join(rel_dir, file))
+			if rel not in wanted_files and rel not in keep:
+				os.remove(path.join(dirname, file))
+				removed += 1
+		if path.normpath(rel_dir) not in wanted_dirs and not os.listdir(dirname):
+			os.rmdir(dirname)
+
+	return len(pending) + transformed, removed
+
+
+def _precompressed_original(name: str) -> str | None:
+	"""The output a precompressed copy like `index.html.gz` was made from, or `None` for other files."""
+	for suffix in PRECOMPRESSED_SUFFIXES:
+		if name.endswith(suffix):
+			return name.removesuffix(suffix)
+	return None
+
+
+@cache
+def _dist_version(dist: str) -> str | None:
+	"""Returns the installed version of a distribution, or `None` if it isn't installed."""
+	from importlib import metadata
+
+	try:
+		return metadata.version(dist)
+	except metadata.PackageNotFoundError:
+		return None
+
+
+def _stat_stamp(filename: str) -> tuple[int, int]:
+	"""Returns a (mtime, size) tuple that changes whenever the file is modified."""
+	st = os.stat(filename)
+	return st.st_mtime_ns, st.st_size
+
+
+def _parse_frontmatter(filename: str) -> dict[str, Any]:
+	"""
+	Parses the YAML frontmatter of a markdown file the same way `frontmatter.parse()` does, but stops
+	reading at the end of the frontmatter instead of loading the whole file.
+	"""
+	import yaml
+
+	loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+	lines = []
+	with open(filename, "r") as file:
+		for line in file:
+			if lines or line.strip():
+				lines.append(line)
+			if len(lines) == 1 and not _FRONTMATTER_BOUNDARY.fullmatch(line.rstrip("\n")):
+				return {}  # no frontmatter
+			if len(lines) > 1 and _FRONTMATTER_BOUNDARY.fullmatch(line.rstrip("\n")):
+				break
+		else:
+			return {}  # not terminated, so it isn't frontmatter
+
+	meta = yaml.load("".join(lines[1:-1]), Loader=loader)
+	return meta if isinstance(meta, dict) else {}
+
+
+def _stable_repr(value: Any) -> str:
+	"""
+	Like `repr()`, but stable across processes: functions and classes are represented by their
+	qualified name instead of their memory address. Used to turn configuration into cache keys.
+	"""
+	if isinstance(value, dict):
+		items = sorted((_stable_repr(k), _stable_repr(v)) for k, v in value.items())
+		return "{" + ", ".join(f"{k}: {v}" for k, v in items) + "}"
+	if isinstance(value, (list, tuple)):
+		return "[" + ", ".join(map(_stable_repr, value)) + "]"
+	if callable(value):
+		return f"{getattr(value, '__module__', '?')}.{getattr(value, '__qualname__', '?')}"
+	return repr(value)
+
+
 class SiteGenerator:
 	"""
 	`SiteGenerator` contains the context and functionality needed to generate your site.
@@ -71,13 +423,27 @@ class SiteGenerator:
 	profile: Literal["dev", "prod"]
 	""" Release profile. Can be 'dev' (development) or 'prod' (production) """
 
-	jinja_env: jinja2.Environment
-	""" Jinja2 environment data """
-
 	original_cwd: str
 	""" The original working directory of the process when launched. """
 
-	_md_instance: markdown.Markdown
+	cache_path: str
+	""" Directory where build caches are persisted between runs """
+
+	jobs: int
+	""" Maximum number of worker processes used by `build_pages()` and `load_md_many()` """
+
+	stream_pages: bool
+	"""
+	Render pages chunk by chunk and write the chunks as they're generated, instead of building each
+	page as one string first. Keeps memory use bounded for very large pages. Ignored in the prod
+	profile, as minification needs the whole page.
+	"""
+
+	output_backend: OutputBackend
+	"""
+	Where the outputs of every completed build session are published to, see `solstice.outputs`.
+	Defaults to `FilesystemOutput`, i.e. the output directory is the site.
+	"""
 
 	def __init__(
 		self,
@@ -85,45 +451,173 @@ class SiteGenerator:
 		output_path: str | None = None,
 		templates_path: str | None = None,
 		profile: Literal["dev", "prod"] = "dev",
+		cache_path: str | None = None,
+		jobs: int | None = None,
+		stream_pages: bool = False,
+		output_backend: OutputBackend | None = None,
 	):
 		if project_dir is None:
-			import inspect
+			import sys
 
-			# python magic to get the path of the caller
-			prev_frame = inspect.stack()[1]
-			project_dir = path.dirname(path.abspath(prev_frame.filename))
+			# python magic to get the path of the caller (much cheaper than `inspect.stack()`)
+			caller = sys._getframe(1).f_code.co_filename
+			project_dir = path.dirname(path.abspath(caller))
 
 		self.project_dir = project_dir
 		self.original_cwd = os.getcwd()
+		self._worker_config = {
+			"project_dir": path.abspath(project_dir),
+			"output_path": output_path,
+			"templates_path": templates_path,
+			"profile": profile,
+			"cache_path": cache_path,
+			"jobs": 1,
+			"stream_pages": stream_pages,
+		}
 		os.chdir(self.project_dir)
 
 		self.output_path = output_path or "dist"
 
+		# by default the cache lives next to the output directory, so cleaning the output keeps it
+		self.cache_path = cache_path or path.join(
+			path.dirname(path.normpath(self.output_path)), ".solstice-cache"
+		)
+
 		self.templates_path = templates_path or "templates"
 
 		self.profile = profile
 
-		self.jinja_env = jinja2.Environment(
+		self.jobs = jobs or os.cpu_count() or 1
+		self.stream_pages = stream_pages
+		self._executor = None
+		self.output_backend = output_backend or FilesystemOutput()
+
+		# fingerprinted assets: output-relative path -> fingerprinted output-relative path
+		self._assets: dict[str, str] = {}
+		self._asset_dirs: set[str] = set()
+		self._tracked_assets: dict[str, str] | None = None
+		self._file_digests = DiskCache(self.cache_path, "digests")
+
+		# responsive images: URL of the original -> its size and variants; see `images()`
+		self._images: dict[str, dict[str, Any]] = {}
+		self._images_digest: str | None = None
+		self._image_cache = DiskCache(self.cache_path, "images")
+
+		# SVG icons: name -> (asset name of the sprite it's in, attributes of its `<svg>`); see `icons()`
+		self._icons: dict[str, tuple[str, dict[str, str]]] = {}
+
+		# stylesheet bundles and the class names used by pages, see `bundle_css()`
+		self._css_cache = DiskCache(self.cache_path, "css")
+		# characters used by each file, see `subset_fonts()`
+		self._font_cache = DiskCache(self.cache_path, "fonts")
+
+		self._md_cache = DiskCache(self.cache_path, "markdown")
+		# absolute source path -> (stat stamp, frontmatter)
+		self._frontmatter: dict[str, tuple[tuple[int, int], dict[str, Any]]] = {}
+		self._frontmatter_cache = DiskCache(self.cache_path, "frontmatter")
+		self._minify_cache = DiskCache(self.cache_path, "minify")
+
+		# template dependency graph: output path -> templates it was rendered through
+		self._page_templates: dict[str, set[str]] = {}
+		# output path -> assets it links to and the URLs they resolved to
+		self._page_assets: dict[str, dict[str, str]] = {}
+		self._page_records = DiskCache(self.cache_path, "pages")
+
+		# outputs produced by the current build session (output path -> source), see `build_session()`
+		self._outputs: dict[str, str | None] | None = None
+		# real paths of the files that changed since the previous session, in a targeted session
+		self._changed: set[str] | None = None
+		# in a targeted session whose changes can't affect the parameters of any page, the names of the
+		# templates that changed; see `_page_unaffected()`
+		self._changed_templates: set[str] | None = None
+		# real paths of the directories passed to `copy()` and `icons()`, whose files only end up in
+		# pages through their asset URLs
+		self._static_dirs: set[str] = set()
+		self._manifests = DiskCache(self.cache_path, "manifests")
+		self._template_digests: dict[str, tuple[str | None, tuple[int, int] | None, str]] = {}
+
+	@cached_property
+	def jinja_env(self) -> "TrackingEnvironment":
+		"""Jinja2 environment data. Created on first use."""
+		import jinja2
+
+		from .templating import TrackingEnvironment
+
+		# compiled templates are cached on disk; Jinja itself invalidates entries when a template's source
+		# changes, and the Jinja version is part of the directory name since it doesn't check that itself
+		bytecode_dir = path.join(self.cache_path, f"jinja-{_dist_version('Jinja2')}")
+		os.makedirs(bytecode_dir, exist_ok=True)
+
+		env = TrackingEnvironment(
 			loader=jinja2.FileSystemLoader(self.templates_path),
 			autoescape=True,
 			optimized=(self.profile == "prod"),
+			bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_dir),
 		)
-		self.jinja_env.globals["profile"] = self.profile
-
-		self._md_instance = markdown.Markdown(
-			extensions=[
-				"admonition",
-				"pymdownx.extra",
-				"pymdownx.tilde",
-				"toc",
-				EmojiExtension(emoji_generator=emoji_to_alt),
-				HighlightExtension(
-					css_class="codehilite",
-					linenums=True,
-				),
-				LaTeX2MathMLExtension(),
-			],
+		env.globals["profile"] = self.profile
+		env.globals["asset"] = self.asset
+		env.globals["icon"] = self.icon
+		return env
+
+	@cached_property
+	def _md_instance(self) -> "markdown.Markdown":
+		"""The markdown converter, built from `_MD_EXTENSIONS` on first use."""
+		import markdown
+		from pymdownx import emoji
+
+		configs = {name: dict(config) for name, config in _MD_EXTENSIONS}
+		configs["pymdownx.emoji"]["emoji_generator"] = getattr(
+			emoji, configs["pymdownx.emoji"]["emoji_generator"]
 		)
+		# not part of `_MD_EXTENSIONS`, as where caches live doesn't affect the output
+		for name in configs:
+			if name.startswith("solstice.extensions:"):
+				configs[name]["cache_path"] = self.cache_path
+		return markdown.Markdown(extensions=list(configs), extension_configs=configs)
+
+	@cached_property
+	def _md_fingerprint(self) -> str:
+		"""
+		Digest of everything besides the source that affects the output of `load_md`: the markdown
+		extension configuration and the versions of the libraries doing the conversion.
+		"""
+		versions = [(dist, _dist_version(dist)) for dist in _MD_DISTRIBUTIONS]
+		return digest(str(CACHE_VERSION), _stable_repr(_MD_EXTENSIONS), _stable_repr(versions))
+
+	def set_profile(self, profile: Literal["dev", "prod"]):
+		"""
+		Change the release profile after the generator was created, e.g. in response to a CLI flag.
+		"""
+		self.profile = profile
+		# only touch the Jinja environment if it was created already; otherwise it picks up the new profile itself
+		if "jinja_env" in self.__dict__:
+			self.jinja_env.optimized = profile == "prod"
+			self.jinja_env.globals["profile"] = profile
+		self._worker_config["profile"] = profile
+		# workers were started with the old profile
+		self.close()
+
+	def close(self):
+		"""
+		Shut down the worker processes started by `build_pages()`, if any. The generator can still be
+		used afterwards; workers are started again when they're needed. Generators are also context
+		managers that close themselves on exit.
+
+		# Example
+		```python
+		with SiteGenerator(__package__) as ssg:
+		    ssg.build_pages(pages)
+		```
+		"""
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
+
+	def __enter__(self) -> "SiteGenerator":
+		return self
+
+	def __exit__(self, *_):
+		self.close()
 
 	def output_path_for(self, name: str) -> str:
 		"""
@@ -134,9 +628,382 @@ class SiteGenerator:
 		os.makedirs(dirname, exist_ok=True)
 		return p
 
+	def _minify(self, kind: Literal["html", "css", "js"], source: str) -> str:
+		"""
+		Minify HTML (including inline CSS and JS), or a standalone CSS or JS file.
+		Results are cached by content, so unchanged outputs are never minified twice.
+		"""
+		with span("minify", kind=kind):
+			return self._minify_uncached(kind, source)
+
+	def _minify_uncached(self, kind: Literal["html", "css", "js"], source: str) -> str:
+		import minify_html
+
+		options = _stable_repr([_dist_version("minify_html"), _MINIFY_OPTIONS])
+		key = digest(str(CACHE_VERSION), kind, options, source)
+		if (cached := self._minify_cache.get(key)) is not None:
+			return cached
+
+		match kind:
+			case "html":
+				result = minify_html.minify(source, **_MINIFY_OPTIONS)
+			case "css" | "js":
+				# minify_html only handles whole documents; wrap the file in the matching element and strip it afterwards
+				tag = "style" if kind == "css" else "script"
+				result = minify_html.minify(f"<{tag}>{source}</{tag}>", **_MINIFY_OPTIONS)
+				result = result.removeprefix(f"<{tag}>").removesuffix(f"</{tag}>")
+
+		self._minify_cache.set(key, result)
+		return result
+
+	def write_output(self, name: str, data: str | bytes) -> bool:
+		"""
+		Write a file to the output path, skipping the write if the file is unchanged.
+		See `write_if_changed()`.
+
+		# Returns
+		`True` if the file was written, `False` if it was already up to date.
+		"""
+		self._record_output(name, None)
+		return write_if_changed(self.output_path_for(name), data)
+
+	def write_output_chunks(self, name: str, chunks: Iterable[str | bytes]) -> bool:
+		"""
+		Like `write_output()`, but for data that is produced in chunks. See `write_chunks_if_changed()`.
+		"""
+		self._record_output(name, None)
+		return write_chunks_if_changed(self.output_path_for(name), chunks)
+
+	def _record_output(self, name: str, source: str | None):
+		"""Marks `name` as an output of the current build session, if there is one."""
+		if self._outputs is None:
+			return
+		name = path.normpath(name).replace(os.sep, "/")
+		# keep the most specific source; e.g. `write_output` doesn't know which page it writes for
+		if source is not None or name not in self._outputs:
+			self._outputs[name] = source
+
+	@contextmanager
+	def build_session(self, changed: Iterable[str] | None = None):
+		"""
+		Track every output written (or kept because it was up to date) inside the `with` block. When the
+		block finishes without errors, outputs of the previous session that weren't produced again (e.g.
+		for deleted or renamed posts) are removed, and a manifest of all outputs, their sources and
+		content hashes is persisted for the next session to compare against.
+
+		In the prod profile, compressible outputs (HTML, CSS, SVG, ...) also get precompressed copies
+		next to them, e.g. `index.html.gz`, for servers that can send those directly. Copies of outputs
+		whose content didn't change since the previous session are kept as they are.
+
+		Yields a dict that is filled with the output paths that were `"added"`, `"changed"` and
+		`"removed"` compared to the previous session, so e.g. a deploy step can upload just those.
+
+		Passing the paths of the files that changed since the previous session (e.g. as reported by a
+		file watcher) as `changed` makes it a targeted session: steps whose inputs are known and didn't
+		change, like `copy()` of a directory without changes, are skipped entirely and keep their
+		outputs from the previous session. Pages built before by this generator are skipped without
+		being checked when nothing they depend on changed, as long as all changed files are templates,
+		files in directories passed to `copy()` or `icons()`, or markdown files with unchanged
+		frontmatter. Otherwise every page is checked (see `Page.build()`), as page parameters may be
+		derived from any file, e.g. a list of posts from their frontmatter.
+
+		# Example
+		```python
+		with ssg.build_session() as changes:
+			build()
+		upload(changes["added"] + changes["changed"])
+		```
+		"""
+		changes: dict[str, list[str]] = {}
+		outer = self._outputs, self._changed, self._changed_templates
+		self._outputs = {}
+		self._changed = None if changed is None else {path.realpath(p) for p in changed}
+		self._changed_templates = None if changed is None else self._template_changes(self._changed)
+		try:
+			yield changes
+			changes.update(self._finish_build_session(self._outputs))
+		finally:
+			self._outputs, self._changed, self._changed_templates = outer
+
+	def _template_changes(self, changed: set[str]) -> set[str] | None:
+		"""
+		The names of the templates among `changed`, or `None` if any of the other files may change
+		what pages are built with. Those are files in directories passed to `copy()` and `icons()`
+		(which pages only link to), and markdown files whose frontmatter didn't change (whose body only
+		ends up in the page built from them). Anything else, e.g. a data file read by the build script,
+		may end up in the parameters of any page.
+		"""
+		templates_dir = path.realpath(self.templates_path) + os.sep
+		static_dirs = tuple(dir + os.sep for dir in self._static_dirs)
+		templates = set()
+		for changed_path in changed:
+			if changed_path.startswith(templates_dir):
+				templates.add(path.relpath(changed_path, templates_dir).replace(os.sep, "/"))
+			elif changed_path.startswith(static_dirs):
+				continue
+			elif not changed_path.endswith(".md") or not path.isfile(changed_path):
+				return None
+			else:
+				# a new file, or one whose frontmatter changed, may show up in lists of posts etc.
+				previous = self._frontmatter.get(path.abspath(changed_path))
+				if previous is None or previous[1] != self.load_frontmatter(changed_path):
+					return None
+		return templates
+
+	def _page_unaffected(self, page: "Page") -> bool:
+		"""
+		Whether `page` can be skipped without even checking it, because the current session is targeted
+		and none of its changes can affect it: none of the templates it was rendered through, its own
+		source or the assets it links to changed. See `_template_changes()`.
+		"""
+		if self._changed_templates is None:
+			return False
+		templates = self._page_templates.get(page.output_path)
+		assets = self._page_assets.get(page.output_path)
+		if templates is None or assets is None:
+			return False  # not built by this process yet
+		return (
+			not templates & self._changed_templates
+			and not self._has_changes(page._source)
+			and all(self._resolve_asset(name) == url for name, url in assets.items())
+			and path.exists(self.output_path_for(page.output_path))
+		)
+
+	def _has_changes(self, *paths: str) -> bool:
+		"""
+		Whether any of the given files or directories changed since the previous session, as far as the
+		current session knows. Always `True` outside of targeted sessions, see `build_session()`.
+		"""
+		if self._changed is None:
+			return True
+		roots = [path.realpath(p) for p in paths]
+		return any(
+			changed == root or changed.startswith(root + os.sep)
+			for changed in self._changed
+			for root in roots
+		)
+
+	def _keep_outputs(self, prefix: str):
+		"""
+		Records the outputs of the previous session whose paths start with `prefix` as outputs of the
+		current one, for steps that are skipped because none of their inputs changed.
+		"""
+		previous = self._previous_manifest()
+		for name, (source, _hash) in previous.items():
+			# precompressed copies are recorded by `precompress()`, in release builds only; copied
+			# files are their own source, so those are kept even if they look like one
+			if _precompressed_original(name) in previous and source != name:
+				continue
+			if name.startswith(prefix) and path.exists(path.join(self.output_path, name)):
+				self._record_output(name, source)
+
+	def _previous_manifest(self) -> dict[str, tuple[str | None, str]]:
+		"""Manifest of the last completed build session: output path -> (source, content digest)."""
+		return self._manifests.get(digest(str(CACHE_VERSION), path.abspath(self.output_path))) or {}
+
+	def _finish_build_session(self, outputs: dict[str, str | None]) -> dict[str, list[str]]:
+		key = digest(str(CACHE_VERSION), path.abspath(self.output_path))
+		previous = self._previous_manifest()
+
+		manifest = {}
+		for name, source in outputs.items():
+			full = path.join(self.output_path, name)
+			if path.isfile(full):
+				manifest[name] = (source, self._file_digest(full))
+
+		if self.profile == "prod":
+			from .compress import precompress
+
+			with span("precompress"):
+				manifest.update(precompress(self, manifest, previous))
+
+		removed = sorted(previous.keys() - manifest.keys())
+		for name in removed:
+			full = path.join(self.output_path, name)
+			if path.lexists(full):
+				os.remove(full)
+			# clean up directories that are empty now, up to (but excluding) the output directory
+			parent = path.dirname(name)
+			while parent:
+				try:
+					os.rmdir(path.join(self.output_path, parent))
+				except OSError:
+					break  # not empty, or already gone
+				parent = path.dirname(parent)
+
+		self._manifests.set(key, manifest)
+		self.output_backend.publish(self, manifest)
+		changes = {
+			"added": sorted(manifest.keys() - previous.keys()),
+			"changed": sorted(
+				name
+				for name in manifest.keys() & previous.keys()
+				if manifest[name] != previous[name]
+			),
+			"removed": removed,
+		}
+		info(
+			f"{len(changes['added'])} output(s) added, {len(changes['changed'])} changed, "
+			f"{len(removed)} removed"
+		)
+		return changes
+
+	def outputs_of(self, source: str) -> list[str]:
+		"""
+		Outputs produced from `source` (a template, markdown file or copied file) in the last completed
+		build session. See `build_session()`.
+		"""
+		manifest = self._previous_manifest()
+		return sorted(name for name, (src, _hash) in manifest.items() if src == source)
+
 	def render(self, name: str, **kwargs) -> str:
 		"""Render a template with the given values."""
-		return self.jinja_env.get_template(name).render(kwargs)
+		with span("render", template=name):
+			return self.jinja_env.get_template(name).render(kwargs)
+
+	def render_chunks(self, name: str, **kwargs) -> Iterator[str]:
+		"""
+		Render a template with the given values piece by piece, as it is evaluated, instead of as a whole.
+		Nothing is rendered until the result is iterated over.
+
+		# Example
+		```python
+		ssg.write_output_chunks("gallery.html", ssg.render_chunks("gallery.jinja", images=images))
+		```
+		"""
+		return self.jinja_env.get_template(name).generate(kwargs)
+
+	@contextmanager
+	def _tracking(self):
+		"""
+		Collects the names of all templates loaded inside the `with` block, and the assets looked up
+		through `asset()` along with the URLs they resolved to.
+		"""
+		env = self.jinja_env
+		outer = env._tracked, self._tracked_assets
+		templates: set[str] = set()
+		assets: dict[str, str] = {}
+		env._tracked, self._tracked_assets = templates, assets
+		try:
+			yield templates, assets
+		finally:
+			env._tracked, self._tracked_assets = outer
+
+	def _render_tracked(self, name: str, **kwargs) -> tuple[str, set[str], dict[str, str]]:
+		"""Like `render()`, but also returns what `_tracking()` collected during the render."""
+		with self._tracking() as (templates, assets):
+			contents = self.render(name, **kwargs)
+		return contents, templates, assets
+
+	def _template_digest(self, name: str) -> str | None:
+		"""
+		Digest of a template's source, or `None` if it doesn't exist (anymore).
+		Digests are memoized on the file's mtime and size, so unchanged templates are not re-read.
+		"""
+		if entry := self._template_digests.get(name):
+			filename, stamp, value = entry
+			try:
+				if filename and stamp == _stat_stamp(filename):
+					return value
+			except OSError:
+				pass
+
+		from jinja2 import TemplateNotFound
+
+		assert self.jinja_env.loader
+		try:
+			source, filename, _ = self.jinja_env.loader.get_source(self.jinja_env, name)
+		except TemplateNotFound:
+			self._template_digests.pop(name, None)
+			return None
+
+		value = digest(source)
+		stamp = _stat_stamp(filename) if filename else None
+		self._template_digests[name] = (filename, stamp, value)
+		return value
+
+	def _page_fingerprint(self, template_name: str, params: dict[str, Any]) -> str | None:
+		"""
+		Digest of everything that goes into rendering a page, except for the templates themselves.
+		Returns `None` if the parameters can't be serialized, in which case the page is always rebuilt.
+		"""
+		try:
+			serialized = pickle.dumps(params, protocol=pickle.HIGHEST_PROTOCOL)
+		except Exception:
+			return None
+		env = self.jinja_env
+		return digest(
+			str(CACHE_VERSION),
+			template_name,
+			serialized,
+			_stable_repr(env.globals),
+			# page records persist across runs, so anything else that changes the rendered or minified
+			# result has to be part of the fingerprint too
+			_stable_repr([env.filters, env.tests]),
+			_stable_repr([_dist_version("Jinja2"), _dist_version("minify_html"), _MINIFY_OPTIONS]),
+		)
+
+	def _page_key(self, output_path: str) -> str:
+		return digest(str(CACHE_VERSION), path.abspath(path.join(self.output_path, output_path)))
+
+	def _page_is_fresh(self, output_path: str, fingerprint: str | None) -> bool:
+		"""
+		Checks whether the page at `output_path` was previously built with the same fingerprint, and
+		none of the templates it was rendered through or the assets it links to have changed since.
+		"""
+		if fingerprint is None or not path.exists(path.join(self.output_path, output_path)):
+			return False
+
+		record = self._page_records.get(self._page_key(output_path))
+		if record is None:
+			return False
+
+		prev_fingerprint, templates, assets = record
+		if prev_fingerprint != fingerprint:
+			return False
+		if any(self._template_digest(name) != value for name, value in templates.items()):
+			return False
+		if any(self._resolve_asset(name) != url for name, url in assets.items()):
+			return False
+
+		self._page_templates[output_path] = set(templates)
+		self._page_assets[output_path] = dict(assets)
+		return True
+
+	def _record_page(
+		self,
+		output_path: str,
+		fingerprint: str | None,
+		templates: set[str],
+		assets: dict[str, str],
+	):
+		"""Stores the template and asset dependencies of a freshly built page."""
+		self._page_templates[output_path] = templates
+		self._page_assets[output_path] = assets
+		if fingerprint is None:
+			return
+		digests = {name: self._template_digest(name) for name in templates}
+		self._page_records.set(self._page_key(output_path), (fingerprint, digests, assets))
+
+	def template_dependencies(self, output_path: str) -> set[str]:
+		"""
+		Returns the names of all templates the page at `output_path` was rendered through during this
+		process, including templates pulled in through `{% extends %}`, `{% import %}` and `{% include %}`.
+		"""
+		return set(self._page_templates.get(output_path, ()))
+
+	def pages_affected_by(self, template_names: Iterable[str]) -> set[str]:
+		"""
+		Returns the output paths of all pages that have to be re-rendered when any of the given
+		templates change.
+
+		# Example
+		```python
+		ssg.pages_affected_by(["member.jinja"])  # {"member/bob.html", "member/johndoe.html"}
+		```
+		"""
+		changed = set(template_names)
+		return {page for page, templates in self._page_templates.items() if templates & changed}
 
 	def md_to_html(self, markdown: str) -> tuple[str, str]:
 		"""
@@ -147,36 +1014,638 @@ class SiteGenerator:
 		# Returns
 		A tuple containing the HTML content and the table of contents (if any).
 		"""
-		self._md_instance.reset()
-		content = self._md_instance.convert(markdown)
-		return content, self._md_instance.toc  # type: ignore
+		with span("markdown"):
+			self._md_instance.reset()
+			content = self._md_instance.convert(markdown)
+			return content, self._md_instance.toc  # type: ignore
 
 	def load_md(self, path: str) -> tuple[str, str, dict[str, Any]]:
 		"""
 		Load a markdown file, parse its frontmatter, and convert the remaining source to HTML.
+		Results are cached on disk, keyed on the file contents and the markdown configuration, so an
+		unchanged file is never converted twice.
 		# Arguments
 		- `path`: The path to the markdown file.
 
 		# Returns
 		A tuple containing the HTML content, table of contents, and frontmatter metadata.
 		"""
-		with open(path, "r") as f:
-			meta, content = frontmatter.parse(f.read())
+		with span("load_md", path=path):
+			with open(path, "r") as f:
+				source = f.read()
+
+			key = digest(self._md_fingerprint, source)
+			if (cached := self._md_cache.get(key)) is not None:
+				return cached
+
+			import frontmatter
+
+			with span("frontmatter"):
+				meta, content = frontmatter.parse(source)
 			content, toc = self.md_to_html(content)
+			self._md_cache.set(key, (content, toc, meta))
 			return content, toc, meta
 
-	def copy(self, dir: str):
+	def load_frontmatter(self, path: str) -> dict[str, Any]:
+		"""
+		Load only the frontmatter of a markdown file, without converting (or even reading) its body.
+		Results are cached in memory and on disk, and only reparsed when the file's modification time
+		or size changes.
+
+		# Arguments
+		- `path`: The path to the markdown file.
+
+		# Returns
+		The frontmatter metadata, the same as returned by `load_md()`.
+		"""
+		# `path` shadows the module here
+		full_path = os.path.abspath(path)
+		key = digest(str(CACHE_VERSION), full_path)
+		stamp = _stat_stamp(full_path)
+		cached = self._frontmatter.get(full_path) or self._frontmatter_cache.get(key)
+		if cached is not None and cached[0] == stamp:
+			self._frontmatter[full_path] = cached
+			return dict(cached[1])
+
+		with span("frontmatter", path=path):
+			meta = _parse_frontmatter(full_path)
+		self._frontmatter[full_path] = (stamp, meta)
+		self._frontmatter_cache.set(key, (stamp, meta))
+		return dict(meta)
+
+	# batches smaller than this are processed in-process, as starting workers would cost more than it saves
+	_PARALLEL_MIN_BATCH = 8
+
+	def _pool(self, batch_size: int):
+		"""Returns the process pool to use for a batch of `batch_size` jobs, or `None` if it's not worth it."""
+		if self.jobs <= 1 or batch_size < self._PARALLEL_MIN_BATCH:
+			return None
+		if self._executor is None:
+			import multiprocessing
+			from concurrent.futures import ProcessPoolExecutor
+
+			# spawn rather than fork: forking a process that runs the dev server thread is unsafe
+			self._executor = ProcessPoolExecutor(
+				max_workers=self.jobs,
+				mp_context=multiprocessing.get_context("spawn"),
+				initializer=_init_worker,
+				initargs=(self._worker_config,),
+			)
+		return self._executor
+
+	def _worker_globals(self) -> dict[str, Any]:
+		"""Jinja globals set on this generator that workers need to render pages identically."""
+		from jinja2.defaults import DEFAULT_NAMESPACE
+
+		defaults = DEFAULT_NAMESPACE
+		shared = {}
+		for key, val in self.jinja_env.globals.items():
+			# methods of the generator itself (like `asset`) are registered by the workers' own generator
+			if key in defaults or getattr(val, "__self__", None) is self:
+				continue
+			try:
+				pickle.dumps(val)
+			except Exception:
+				warn(
+					f"jinja global '{key}' can't be sent to worker processes, it will be missing there"
+				)
+				continue
+			shared[key] = val
+		return shared
+
+	def load_md_many(self, paths: Iterable[str]) -> list[tuple[str, str, dict[str, Any]]]:
+		"""
+		Like `load_md()`, but loads multiple files at once, spreading the conversion over multiple
+		processes. Results are returned in the same order as `paths`, and are also kept in memory, so
+		constructing a `MarkdownPage` for any of these files afterwards doesn't convert it again.
+
+		# Example
+		```python
+		paths = ["blog/a.md", "blog/b.md"]
+		ssg.load_md_many(paths)  # converts both files in parallel
+		pages = [solstice.MarkdownPage(ssg, "blog.jinja", p) for p in paths]  # served from memory
+		```
+		"""
+		paths = list(paths)
+		pool = self._pool(len(paths))
+		if pool is None:
+			return [self.load_md(p) for p in paths]
+
+		results = []
+		for key, result, records in pool.map(_load_md_in_worker, paths):
+			replay_logs(records)
+			self._md_cache.set(key, result, persist=False)
+			results.append(result)
+		return results
+
+	def build_pages(self, pages: Iterable["Page"]):
+		"""
+		Build multiple pages at once, spreading rendering (and markdown conversion, if it hasn't happened
+		yet) over multiple processes. Up-to-date pages are skipped without being sent to a worker.
+		Logs from the workers are replayed in order once their page is done.
+
+		# Example
+		```python
+		pages = [
+			solstice.MarkdownPage(ssg, "blog.jinja", path).set_params(section="blog")
+			for path in ["blog/a.md", "blog/b.md"]
+		]
+		ssg.build_pages(pages)
+		```
+		"""
+		stale = []
+		for page in pages:
+			self._record_output(page.output_path, page._source)
+			if self._page_unaffected(page):
+				continue
+			with span("check", output=page.output_path):
+				page._prepare()
+				fingerprint = page._fingerprint()
+				fresh = self._page_is_fresh(page.output_path, fingerprint)
+			if fresh:
+				debug(f"'{page.output_path}' is up to date, skipping")
+				continue
+			stale.append((page, fingerprint))
+
+		pool = self._pool(len(stale))
+		if pool is None:
+			for page, fingerprint in stale:
+				self._record_page(page.output_path, fingerprint, *page._write())
+			return
+
+		shared = self._worker_globals(), self._assets, self._asset_dirs, self._images, self._icons
+		jobs = [(page, shared) for page, _ in stale]
+		for (page, fingerprint), (deps, records) in zip(stale, pool.map(_build_in_worker, jobs)):
+			replay_logs(records)
+			self._record_page(page.output_path, fingerprint, *deps)
+
+	def _resolve_asset(self, name: str) -> str:
+		name = name.lstrip("/")
+		hashed = self._assets.get(name)
+		if hashed is None:
+			hashed = next(
+				(
+					self._assets[key]
+					for d in self._asset_dirs
+					if (key := f"{d}/{name}") in self._assets
+				),
+				name,
+			)
+		return "/" + hashed
+
+	def asset(self, name: str) -> str:
+		"""
+		Returns the URL of a static asset copied with `copy(..., fingerprint=True)`, pointing to its
+		fingerprinted copy. Assets that weren't fingerprinted resolve to their regular URL.
+		Also available as a global in templates.
+
+		# Arguments
+		- `name`: Path of the asset relative to the output directory (`"public/css/blog.css"`), or
+		  relative to a fingerprinted directory (`"css/blog.css"`).
+
+		# Example
+		```jinja
+		<link rel="stylesheet" href="{{ asset('public/css/blog.css') }}" />
+		<!-- <link rel="stylesheet" href="/public/css/blog.3f9a1c02.css" /> -->
+		```
+		"""
+		url = self._resolve_asset(name)
+		if self._tracked_assets is not None:
+			self._tracked_assets[name] = url
+		return url
+
+	def _file_digest(self, filename: str) -> str:
+		"""Content digest of a file, memoized on its path, mtime and size."""
+		key = digest(path.abspath(filename), repr(_stat_stamp(filename)))
+		if (cached := self._file_digests.get(key)) is None:
+			cached = _file_digest(filename)
+			self._file_digests.set(key, cached)
+		return cached
+
+	def _load_asset_manifest(self) -> dict[str, str]:
+		try:
+			with open(path.join(self.output_path, ASSET_MANIFEST), "r") as file:
+				return json.load(file)
+		except (FileNotFoundError, ValueError):
+			return {}
+
+	def _refingerprint_stylesheets(self) -> dict[str, str]:
+		"""
+		Fingerprints the stylesheets among the assets again, after their originals in the output were
+		rewritten (see `subset_fonts()`). Browsers cache fingerprinted copies forever, so those are
+		never changed in place; stylesheets whose contents changed get new copies instead, and the
+		pages built so far are pointed at them.
+
+		# Returns
+		A mapping from every replaced fingerprinted copy to its replacement.
+		"""
+		from .assets import fingerprint_files
+
+		stylesheets = [
+			name
+			for name in self._assets
+			if name.endswith(".css") and path.isfile(self.output_path_for(name))
+		]
+		hashed = fingerprint_files(self, stylesheets, self._assets)
+		replaced = {
+			self._assets[name]: new for name, new in hashed.items() if self._assets[name] != new
+		}
+		if not replaced:
+			return replaced
+
+		for name, new in hashed.items():
+			old = self._assets[name]
+			if old != new:
+				self._record_output(new, name)
+				if self._outputs is not None:
+					self._outputs.pop(old, None)
+				if path.exists(self.output_path_for(old)):
+					os.remove(self.output_path_for(old))
+		self._assets.update(hashed)
+		self.write_output(ASSET_MANIFEST, json.dumps(self._assets, indent="\t", sort_keys=True))
+
+		urls = re.compile("|".join(re.escape(f"/{old}") for old in sorted(replaced)))
+		for page in self._html_outputs():
+			full = self.output_path_for(page)
+			write_if_changed(
+				full, urls.sub(lambda m: f"/{replaced[m.group(0)[1:]]}", read_file(full))
+			)
+		return replaced
+
+	def copy(
+		self,
+		dir: str,
+		mode: Literal["copy", "hardlink", "reflink"] = "copy",
+		checksum: bool = False,
+		fingerprint: bool = False,
+	):
 		"""
 		Copy a directory to the output path, without altering its contents.
 		Used for copying static assets like images, CSS, etc.
 
+		The copy is incremental: only files whose size or modification time differ from the existing
+		output are copied, and outputs whose source file no longer exists are deleted.
+
 		# Arguments
 		- `dir`: The directory to copy.
+		- `mode`: How files are transferred. `"hardlink"` and `"reflink"` avoid copying any data, and
+		  fall back to a regular copy when the filesystem doesn't support them.
+		- `checksum`: Also compare file contents when sizes match, instead of trusting modification times.
+		- `fingerprint`: Also write a copy of every file with a content hash in its name
+		  (`blog.3f9a1c02.css`) and record it in the asset manifest, so it can be served with long-lived
+		  cache headers. Use `asset()` in templates to link to the fingerprinted copies; pages have to be
+		  built after calling `copy()` for that to work.
+
+		In the `prod` profile, CSS and JS files are minified on their way to the output.
+		"""
+		transforms = {}
+		if self.profile == "prod":
+			transforms = {
+				".css": lambda source: self._minify("css", source),
+				".js": lambda source: self._minify("js", source),
+			}
+
+		if not path.exists(dir):
+			return
+
+		dir = path.normpath(dir).replace(os.sep, "/")
+		self._static_dirs.add(path.realpath(dir))
+		if not self._assets:
+			self._assets = self._load_asset_manifest()
+		if not self._has_changes(dir) and fingerprint == (dir in self._asset_dirs):
+			debug(f"Nothing in '{dir}' changed, skipping the copy")
+			self._keep_outputs(dir + "/")
+			self._keep_outputs(ASSET_MANIFEST)
+			return
+		# fingerprinted copies from the previous build are not part of the source directory; don't delete them
+		prev = {
+			path.relpath(hashed, dir)
+			for name, hashed in self._assets.items()
+			if name.startswith(dir + "/")
+		}
+		# neither are the precompressed copies of release builds (see `build_session()`), but those are
+		# recorded or pruned by `precompress()` at the end of the session, not here. only the ones of
+		# files that are still copied are kept until then, so unchanged files aren't compressed again
+		siblings = set()
+		for name in self._previous_manifest():
+			original = _precompressed_original(name)
+			if original is None or not original.startswith(dir + "/"):
+				continue
+			rel, sibling = path.relpath(original, dir), path.relpath(name, dir)
+			still_copied = rel in prev or path.isfile(path.join(dir, rel))
+			# e.g. `data.json.gz` next to `data.json` in the source directory is copied as it is
+			if still_copied and not path.isfile(path.join(dir, sibling)):
+				siblings.add(sibling)
+		keep = prev | siblings
+
+		from .fonts import rewritten_stylesheets
+
+		dist = self.output_path_for(dir)
+		with LogTimer(f"Copying directory '{dir}'..."), span("copy", dir=dir):
+			with span("sync"):
+				copied, removed = sync_tree(
+					dir,
+					dist,
+					mode,
+					checksum,
+					transforms,
+					keep=keep,
+					rewritten=rewritten_stylesheets(self, dir),
+				)
+			debug(f"{copied} file(s) copied, {removed} file(s) removed")
+
+			hashed = {}
+			if fingerprint:
+				from .assets import fingerprint_files
+
+				files = [
+					path.relpath(path.join(dirname, file), self.output_path).replace(os.sep, "/")
+					for dirname, _, files in os.walk(dist)
+					for file in files
+					if path.relpath(path.join(dirname, file), dist) not in keep
+				]
+				with span("fingerprint", files=len(files)):
+					hashed = fingerprint_files(self, files)
+				self._asset_dirs.add(dir)
+			else:
+				self._asset_dirs.discard(dir)
+
+			# drop fingerprinted copies that are no longer current
+			for name in [name for name in self._assets if name.startswith(dir + "/")]:
+				if self._assets[name] not in hashed.values():
+					stale = path.join(self.output_path, self._assets[name])
+					if path.exists(stale):
+						os.remove(stale)
+				del self._assets[name]
+			self._assets.update(hashed)
+
+			sources = {hashed_name: name for name, hashed_name in hashed.items()}
+			for dirname, _, files in os.walk(dist):
+				for file in files:
+					if path.relpath(path.join(dirname, file), dist) in siblings:
+						continue
+					name = path.relpath(path.join(dirname, file), self.output_path).replace(
+						os.sep, "/"
+					)
+					self._record_output(name, sources.get(name, name))
+
+			self.write_output(ASSET_MANIFEST, json.dumps(self._assets, indent="\t", sort_keys=True))
+
+	def images(
+		self,
+		dir: str,
+		widths: list[int] | None = None,
+		formats: list[str] | None = None,
+		quality: int = 70,
+		output_dir: str = "_img",
+		sizes: str | None = None,
+	):
+		"""
+		Generate resized, re-encoded variants of the JPEG and PNG images in `dir`, for `<picture>` markup
+		that lets browsers download an appropriately sized image in a modern format. Images in markdown
+		pages are rewritten to use the variants automatically (see `responsive_images()`); `dir` should
+		also be copied with `copy()`, as the original stays the fallback.
+
+		Variants are cached by the contents of their source image, so each one is only encoded once.
+		Requires Pillow; without it, a warning is shown and images are left as they are.
+
+		# Arguments
+		- `dir`: The directory with images, relative to the project directory.
+		- `widths`: Widths (in pixels) to scale images down to. Images are never scaled up; smaller
+		  images get a single variant at their own width. Defaults to `[480, 960, 1600]`.
+		- `formats`: Formats to encode the variants in, most preferred first. Defaults to
+		  `["avif", "webp"]`.
+		- `quality`: Encoder quality, from 0 to 100.
+		- `output_dir`: Directory in the output to write the variants to.
+		- `sizes`: The `sizes` attribute of the `<picture>` sources, i.e. how wide the images are shown
+		  in the layout, so browsers can pick a variant before the page is laid out. Defaults to the
+		  full width of the layout, `100vw`; pass the width of the content column if it's narrower.
+
+		# Example
+		```python
+		ssg.copy("public")
+		ssg.images("public/img", sizes="(max-width: 800px) 100vw, 50rem")
+		```
+		"""
+		try:
+			import PIL  # noqa: F401
+		except ImportError:
+			warn("Pillow is not installed, skipping responsive image variants")
+			return
+
+		from .images import generate_variants
+
+		if not path.exists(dir):
+			return
+
+		prefix = "/" + path.normpath(dir).replace(os.sep, "/") + "/"
+		# the variants are only known to this process, so the first session always runs the step
+		if not self._has_changes(dir) and any(url.startswith(prefix) for url in self._images):
+			debug(f"No images in '{dir}' changed, keeping their variants")
+			self._keep_outputs(posixpath.join(output_dir, prefix.lstrip("/")))
+			return
+
+		with LogTimer(f"Generating image variants for '{dir}'..."), span("images", dir=dir):
+			images = generate_variants(
+				self,
+				dir,
+				output_dir,
+				widths or [480, 960, 1600],
+				formats or ["avif", "webp"],
+				quality,
+			)
+		if sizes is not None:
+			images = {url: image | {"sizes": sizes} for url, image in images.items()}
+		self._images = {
+			url: image for url, image in self._images.items() if not url.startswith(prefix)
+		} | images
+		self._images_digest = digest(_stable_repr(sorted(self._images.items())))
+
+	def responsive_images(self, html: str, sizes: str | None = None) -> str:
+		"""
+		Rewrites `<img>` tags showing images processed by `images()` into `<picture>` elements offering
+		their variants. Other HTML is returned unchanged. `sizes` overrides the `sizes` attribute the
+		images were registered with (see `images()`).
+
+		# Example
+		```python
+		ssg.responsive_images('<img alt="cat" src="/public/img/cat.jpg" />')
+		# <picture><source type="image/avif" sizes="100vw" srcset="/_img/public/img/cat.480w.1a2b3c4d.avif 480w, ..." />...
+		#   <img alt="cat" src="/public/img/cat.jpg" loading="lazy" /></picture>
+		```
+		"""
+		if not self._images:
+			return html
+
+		from .images import picture_markup
+
+		return picture_markup(html, self._images, sizes)
+
+	def icons(self, dir: str, output_dir: str = "_icons"):
+		"""
+		Collect the SVG files in `dir` into a single fingerprinted sprite, so pages can show them with
+		`icon()` instead of repeating their markup. Browsers download the sprite once and cache it for
+		every page. Call this before building the pages that use the icons.
+
+		# Arguments
+		- `dir`: The directory with icons. An icon is named after its path relative to `dir`, without
+		  the extension, e.g. `brands/github` for `{dir}/brands/github.svg`.
+		- `output_dir`: Directory in the output to write the sprite to.
+
+		# Example
+		```python
+		ssg.icons("templates/icon")
+		```
+		"""
+		from .assets import fingerprinted_name
+		from .icons import build_sprite
+
+		if not path.exists(dir):
+			return
+		self._static_dirs.add(path.realpath(dir))
+
+		name = posixpath.join(output_dir, path.basename(path.normpath(dir)) + ".svg")
+		if (
+			not self._has_changes(dir)
+			and name in self._assets
+			and any(value[0] == name for value in self._icons.values())
+		):
+			self._keep_outputs(self._assets[name])
+			return
+
+		sources = {}
+		for dirname, file, icon_name, _ in recurse_files(dir, [".svg"]):
+			full = path.join(dirname, file)
+			icon = path.relpath(path.join(dirname, icon_name), dir).replace(os.sep, "/")
+			sources[icon] = read_file(full)
+
+		with span("icons", dir=dir):
+			sprite, elements = build_sprite(sources)
+		hashed = fingerprinted_name(name, hashlib.sha256(sprite.encode()).hexdigest())
+		self.write_output(hashed, sprite)
+		self._record_output(hashed, dir)
+		self._assets[name] = hashed
+
+		self._icons = {icon: value for icon, value in self._icons.items() if value[0] != name} | {
+			icon: (name, element) for icon, element in elements.items()
+		}
+		debug(f"{len(elements)} icon(s) in {hashed}")
+
+	def icon(self, name: str, **attributes: str) -> "Markup":
+		"""
+		Returns an `<svg>` element showing an icon from a sprite made by `icons()`. Also available as a
+		global in templates. Attributes of the icon file's root element that size or identify it (e.g.
+		`width` and `class`) are copied to the element; `attributes` are added on top.
+
+		# Example
+		```jinja
+		{{ icon("github", class="social") }}
+		<!-- <svg xmlns="http://www.w3.org/2000/svg" class="social" viewBox="0 0 24 24"><use href="/_icons/icon.3f9a1c02.svg#github" /></svg> -->
+		```
+		"""
+		from markupsafe import Markup
+
+		from .icons import icon_markup
+
+		if name not in self._icons:
+			raise KeyError(f"unknown icon {name!r}; did you call `icons()` on its directory?")
+		sprite, element = self._icons[name]
+		return Markup(icon_markup(name, self.asset(sprite), element, attributes))
+
+	def bundle_css(
+		self,
+		pages: Iterable[str] | None = None,
+		keep: list[str] | None = None,
+		inline_limit: int = 0,
+		output_dir: str = "_css",
+	):
+		"""
+		Replace the stylesheets each page links to, and everything they pull in through `@import`, with
+		a single bundled stylesheet, so the first paint of a page waits for one request instead of a
+		chain of them. Pages linking the same stylesheets share a bundle, from which every selector that
+		matches none of those pages is removed. Call this after all pages have been built.
+
+		Pruning only looks at the classes, ids and tag names in the built HTML; classes that are only
+		added at runtime (e.g. by JavaScript) have to be listed in `keep`.
+
+		# Arguments
+		- `pages`: Output paths of the pages to bundle the stylesheets of. Defaults to all HTML outputs
+		  of the current build session (see `build_session()`), or all HTML files in the output path if
+		  there is none.
+		- `keep`: Regular expressions for class names, ids and tag names that should be treated as used,
+		  even if no page contains them.
+		- `inline_limit`: Bundles up to this many bytes are inlined into the pages as a `<style>`
+		  element instead, so they don't need a request at all.
+		- `output_dir`: Directory in the output to write the bundles to.
+
+		# Example
+		```python
+		build_pages()
+		ssg.bundle_css(keep=[r"w[1-6]"])
+		```
+		"""
+		from .css import bundle_stylesheets
+
+		pages = self._html_outputs() if pages is None else list(pages)
+		with LogTimer("Bundling stylesheets..."), span("bundle css"):
+			bundles = bundle_stylesheets(self, pages, keep or [], inline_limit, output_dir)
+		debug(f"{bundles} stylesheet bundle(s)")
+
+	def _html_outputs(self) -> list[str]:
+		"""
+		Output paths of all HTML outputs of the current build session (see `build_session()`), or of all
+		HTML files in the output path if there is none.
+		"""
+		if self._outputs is not None:
+			return [name for name in self._outputs if name.endswith(".html")]
+		return [
+			path.relpath(path.join(dirname, file), self.output_path).replace(os.sep, "/")
+			for dirname, file, _, _ in recurse_files(self.output_path, [".html"])
+		]
+
+	def subset_fonts(
+		self,
+		text_files: Iterable[str] = (),
+		pages: Iterable[str] | None = None,
+		output_dir: str = "_fonts",
+	):
+		"""
+		Replace the fonts referenced by `@font-face` rules in the output's stylesheets with subsets that
+		only contain the characters the site uses, and point the rules at them. Call this after all
+		pages have been built, and before `bundle_css()`. Fingerprinted stylesheets (see `copy()`) get
+		new fingerprinted copies, which the pages are pointed at.
+
+		Characters are collected from the text of the pages, `content` declarations in stylesheets and
+		`text_files`. Subsets are cached by the contents of the font and the set of characters, so they
+		are only made again when a new character shows up. Requires fontTools with WOFF2 support
+		(`fonttools[woff]`); without it, a warning is shown and fonts are left as they are.
+
+		# Arguments
+		- `text_files`: Files with more text that ends up in the site, e.g. text included by scripts.
+		- `pages`: Output paths of the pages to collect characters from. Defaults to all HTML outputs of
+		  the current build session (see `build_session()`), or all HTML files in the output path if
+		  there is none.
+		- `output_dir`: Directory in the output to write the subsets to.
+
+		# Example
+		```python
+		build_pages()
+		ssg.subset_fonts(text_files=["ascii/logo.asc"])
+		```
 		"""
-		if path.exists(dir):
-			dist = self.output_path_for(dir)
-			with LogTimer(f"Copying directory '{dir}'..."):
-				shutil.copytree(dir, dist, dirs_exist_ok=True)
+		try:
+			import brotli  # noqa: F401
+			import fontTools  # noqa: F401
+		except ImportError:
+			warn("fontTools with WOFF2 support is not installed, skipping font subsetting")
+			return
+
+		from .fonts import subset_stylesheet_fonts
+
+		pages = self._html_outputs() if pages is None else list(pages)
+		with LogTimer("Subsetting fonts..."), span("subset fonts"):
+			subsets = subset_stylesheet_fonts(self, pages, list(text_files), output_dir)
+		debug(f"{len(subsets)} font(s) subset")
 
 	def clean(self):
 		"""Clean the output directory, removing it and all its contents."""
@@ -307,16 +1776,76 @@ class Page:
 			else:
 				self.params[key] = val
 
+	def __getstate__(self):
+		# the generator can't be pickled; worker processes attach their own
+		state = self.__dict__.copy()
+		del state["gen"]
+		return state
+
+	def _prepare(self):
+		"""Hook for subclasses to finalize the page parameters right before building."""
+		pass
+
+	@property
+	def _source(self) -> str:
+		"""What the page is built from, as recorded in the build manifest; see `SiteGenerator.build_session()`."""
+		return self.template_name
+
+	def _prepare_render(self):
+		"""
+		Hook for subclasses to set parameters that are expensive to compute, once the page is known to
+		need rendering. These are not part of the page's fingerprint.
+		"""
+		pass
+
+	def _fingerprint(self) -> str | None:
+		"""Digest of everything that goes into rendering this page; see `SiteGenerator._page_fingerprint()`."""
+		return self.gen._page_fingerprint(self.template_name, self.params)
+
+	def _write(self) -> tuple[set[str], dict[str, str]]:
+		"""
+		Render the page and write it to the output path.
+		Returns the templates it rendered through and the assets it looked up.
+		"""
+		with self._log_timer, span("page", output=self.output_path):
+			self._prepare_render()
+			if self.gen.stream_pages and self.gen.profile != "prod":
+				# templates are loaded lazily while the chunks are generated, so keep tracking until the end
+				with self.gen._tracking() as (templates, assets), span("render and write"):
+					chunks = self.gen.render_chunks(self.template_name, **self.params)
+					written = self.gen.write_output_chunks(self.output_path, chunks)
+			else:
+				contents, templates, assets = self.gen._render_tracked(
+					self.template_name, **self.params
+				)
+				if self.gen.profile == "prod":
+					contents = self.gen._minify("html", contents)
+				with span("write"):
+					written = self.gen.write_output(self.output_path, contents)
+			if not written:
+				debug(f"'{self.output_path}' did not change, leaving it untouched")
+		return templates, assets
+
 	def build(self):
 		"""
 		Build the page by rendering the template with the provided parameters and saving it to the output path.
 		Called automatically when exiting the context manager.
+
+		If the page was built before with the same parameters and none of the templates it renders
+		through have changed, rendering is skipped entirely.
 		"""
-		with self._log_timer:
-			dest = self.gen.output_path_for(self.output_path)
-			with open(dest, "w") as file:
-				contents = self.gen.render(self.template_name, **self.params)
-				file.write(contents)
+		self.gen._record_output(self.output_path, self._source)
+		if self.gen._page_unaffected(self):
+			return
+		with span("check", output=self.output_path):
+			self._prepare()
+			fingerprint = self._fingerprint()
+			fresh = self.gen._page_is_fresh(self.output_path, fingerprint)
+		if fresh:
+			debug(f"'{self.output_path}' is up to date, skipping")
+			return
+
+		self.gen._record_page(self.output_path, fingerprint, *self._write())
 
 
 class MarkdownPage(Page):
@@ -359,20 +1888,81 @@ class MarkdownPage(Page):
 			f"Built '{self.output_path}' in {{}}",
 		)
 		self.content_path = content_path
-		self.content, self.toc, self.meta = self.gen.load_md(self.content_path)
-
-	def build(self):
+		# only the frontmatter is loaded up front; the body is converted once the page is actually built
+		self.meta = self.gen.load_frontmatter(self.content_path)
+		self._converted: tuple[str, str] | None = None
+
+	def _convert(self) -> tuple[str, str]:
+		if self._converted is None:
+			content, toc, _meta = self.gen.load_md(self.content_path)
+			self._converted = content, toc
+		return self._converted
+
+	@property
+	def content(self) -> str:
+		"""The markdown body converted to HTML. Converted on first access."""
+		return self._convert()[0]
+
+	@property
+	def toc(self) -> str:
+		"""The table of contents of the markdown body. Converted on first access."""
+		return self._convert()[1]
+
+	def _prepare(self):
 		self._set_params_internal(
 			"frontmatter: key '{}' is already set by the caller, skipping...",
 			self.meta,
 			overwrite=False,
 		)
+
+	def _fingerprint(self) -> str | None:
+		# the converted body isn't a parameter yet, so fingerprint its source instead
+		fingerprint = super()._fingerprint()
+		if fingerprint is None:
+			return None
+		# memoized on the file's stat, so unchanged posts aren't read again on every build
+		source = self.gen._file_digest(self.content_path)
+		return digest(fingerprint, self.gen._md_fingerprint, str(self.gen._images_digest), source)
+
+	@property
+	def _source(self) -> str:
+		return self.content_path
+
+	def _prepare_render(self):
 		self._set_params_internal(
 			"key '{}' is reserved for markdown content.",
 			{
-				"content": self.content,
+				"content": self.gen.responsive_images(self.content),
 				"toc": self.toc,
 			},
 		)
 
-		return super().build()
+
+# the generator of a worker process in the pool used by `SiteGenerator.build_pages()`
+_worker_gen: SiteGenerator | None = None
+
+
+def _init_worker(config: dict[str, Any]):
+	global _worker_gen
+	_worker_gen = SiteGenerator(**config)
+
+
+def _load_md_in_worker(content_path: str):
+	assert _worker_gen
+	with capture_logs() as records:
+		with open(content_path, "r") as f:
+			key = digest(_worker_gen._md_fingerprint, f.read())
+		result = _worker_gen.load_md(content_path)
+	return key, result, records
+
+
+def _build_in_worker(job: tuple[Page, dict[str, Any]]):
+	assert _worker_gen
+	page, (shared_globals, assets, asset_dirs, images, icons) = job
+	page.gen = _worker_gen
+	_worker_gen.jinja_env.globals.update(shared_globals)
+	_worker_gen._assets, _worker_gen._asset_dirs = assets, asset_dirs
+	_worker_gen._images, _worker_gen._icons = images, icons
+	with capture_logs() as records:
+		deps = page._write()
+	return deps, records
@@ -1,2 +1,969 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from solstice import (
+	ContentIndex,
+	MarkdownPage,
+	SiteGenerator,
+	sync_tree,
+	write_chunks_if_changed,
+	write_if_changed,
+)
+from solstice.assets import fingerprinted_name
+from solstice.cache import DiskCache, digest
+
+
 def test_dummy():
 	assert True
+
+
+def test_digest_is_length_prefixed():
+	assert digest("ab", "c") != digest("a", "bc")
+	assert digest("abc") == digest(b"abc")
+
+
+def test_disk_cache_roundtrip(tmp_path):
+	key = digest("hello")
+	DiskCache(str(tmp_path), "test").set(key, ("a", {"b": 1}))
+
+	# a fresh instance has an empty memory layer, so this has to come from disk
+	assert DiskCache(str(tmp_path), "test").get(key) == ("a", {"b": 1})
+	assert DiskCache(str(tmp_path), "test").get(digest("other")) is None
+
+
+def test_load_md_cache_hit(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "post.md").write_text("---\ntitle: Hi\n---\n# Hello\n\n$x^2$\n")
+
+	first = SiteGenerator(str(tmp_path)).load_md("post.md")
+
+	ssg = SiteGenerator(str(tmp_path))
+	monkeypatch.setattr(ssg, "md_to_html", lambda _: pytest.fail("markdown was converted again"))
+	assert ssg.load_md("post.md") == first
+	assert first[2]["title"] == "Hi"
+
+
+def test_highlight_cache(tmp_path, monkeypatch):
+	import pymdownx.highlight
+
+	monkeypatch.chdir(tmp_path)
+	code = "```python\ndef f(x):\n    return x\n```\n"
+	(tmp_path / "post.md").write_text("Some prose.\n\n" + code)
+	first = SiteGenerator(str(tmp_path)).load_md("post.md")[0]
+
+	(tmp_path / "post.md").write_text("Edited prose.\n\n" + code)
+	monkeypatch.setattr(
+		pymdownx.highlight, "highlight", lambda *_: pytest.fail("code was highlighted again")
+	)
+	edited = SiteGenerator(str(tmp_path)).load_md("post.md")[0]
+	assert edited == first.replace("Some", "Edited")
+
+
+def test_mathml_cache(tmp_path, monkeypatch):
+	from solstice import extensions
+
+	monkeypatch.chdir(tmp_path)
+	math = "Inline $x^2$ math.\n\n$$\n\\frac{a}{b}\n$$\n"
+	(tmp_path / "post.md").write_text("Some prose.\n\n" + math)
+	first = SiteGenerator(str(tmp_path)).load_md("post.md")[0]
+	assert first.count("<math") == 2
+
+	(tmp_path / "post.md").write_text("Edited prose.\n\n" + math)
+	monkeypatch.setattr(
+		extensions.converter,
+		"convert_to_element",
+		lambda *_, **__: pytest.fail("math was converted again"),
+	)
+	edited = SiteGenerator(str(tmp_path)).load_md("post.md")[0]
+	assert edited == first.replace("Some", "Edited")
+
+
+def test_content_index(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "blog").mkdir()
+	posts = {
+		"a": "authors: [alice]\ndate: 2024-01-01",
+		"b": "authors: [alice, bob]\ndate: 2025-01-01",
+		"c": "authors: [bob]",
+	}
+	for name, fm in posts.items():
+		(tmp_path / "blog" / f"{name}.md").write_text(f"---\n{fm}\n---\n# {name}\n")
+
+	ssg = SiteGenerator(str(tmp_path))
+	monkeypatch.setattr(ssg, "md_to_html", lambda _: pytest.fail("markdown was converted"))
+	index = ContentIndex(ssg, "blog")
+	assert [e.name for e in index.by_date()] == ["b", "a", "c"]
+	assert [e.url for e in index.by_author("alice")] == ["/blog/b", "/blog/a"]
+	assert index.by_author("nobody") == []
+
+	# the body is only converted when the page is built
+	page = MarkdownPage(ssg, "post.jinja", "blog/a.md")
+	assert page.meta["authors"] == ["alice"]
+
+	# frontmatter is reparsed once the file changes
+	(tmp_path / "blog" / "c.md").write_text("---\nauthors: [carol]\n---\n")
+	assert [e.name for e in ContentIndex(ssg, "blog").by_author("carol")] == ["c"]
+
+
+def test_template_dependencies(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	templates = tmp_path / "templates"
+	templates.mkdir()
+	(templates / "base.jinja").write_text("<body>{% block body %}{% endblock %}</body>")
+	(templates / "comps.jinja").write_text("{% macro hi() %}hi{% endmacro %}")
+	(templates / "icon.svg").write_text("<svg></svg>")
+	(templates / "a.jinja").write_text(
+		'{% import "comps.jinja" as comps %}{% extends "base.jinja" %}'
+		"{% block body %}{{ comps.hi() }}{% include icon %}{% endblock %}"
+	)
+	(templates / "b.jinja").write_text('{% extends "base.jinja" %}')
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.page("a.jinja", icon="icon.svg")
+	ssg.page("b.jinja")
+
+	assert ssg.template_dependencies("a.html") == {
+		"a.jinja",
+		"base.jinja",
+		"comps.jinja",
+		"icon.svg",
+	}
+	assert ssg.pages_affected_by(["base.jinja"]) == {"a.html", "b.html"}
+	assert ssg.pages_affected_by(["icon.svg"]) == {"a.html"}
+
+
+def test_page_skipped_when_up_to_date(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	templates = tmp_path / "templates"
+	templates.mkdir()
+	(templates / "a.jinja").write_text("{{ x }}")
+	(templates / "b.jinja").write_text("{{ x }}!")
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.page("a.jinja", x=1)
+	ssg.page("b.jinja", x=1)
+
+	rendered = []
+	render = ssg.render
+	monkeypatch.setattr(
+		ssg, "render", lambda name, **kw: rendered.append(name) or render(name, **kw)
+	)
+
+	(templates / "b.jinja").write_text("{{ x }}?")
+	ssg.page("a.jinja", x=1)
+	ssg.page("b.jinja", x=1)
+	assert rendered == ["b.jinja"]
+	assert (tmp_path / "dist" / "b.html").read_text() == "1?"
+
+	ssg.page("a.jinja", x=2)
+	assert rendered == ["b.jinja", "a.jinja"]
+
+	# new filters, and upgrades of the libraries that render and minify pages, make pages stale too
+	ssg.jinja_env.filters["shout"] = str.upper
+	ssg.page("a.jinja", x=2)
+	assert rendered == ["b.jinja", "a.jinja", "a.jinja"]
+	monkeypatch.setattr(
+		"solstice.sitegen._dist_version", lambda dist: "99.0" if dist == "Jinja2" else None
+	)
+	ssg.page("a.jinja", x=2)
+	assert rendered == ["b.jinja", "a.jinja", "a.jinja", "a.jinja"]
+
+
+def test_build_session_prunes_outputs(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "post.jinja").write_text("{{ content | safe }}")
+	for name in ("a", "b"):
+		(tmp_path / f"{name}.md").write_text(f"# {name}\n")
+	ssg = SiteGenerator(str(tmp_path))
+
+	def build(names):
+		with ssg.build_session() as changes:
+			for name in names:
+				MarkdownPage(ssg, "post.jinja", f"{name}.md", f"blog/{name}.html").build()
+		return changes
+
+	assert build(["a", "b"]) == {
+		"added": ["blog/a.html", "blog/b.html"],
+		"changed": [],
+		"removed": [],
+	}
+	assert ssg.outputs_of("a.md") == ["blog/a.html"]
+
+	(tmp_path / "a.md").write_text("# a, edited\n")
+	assert build(["a"]) == {"added": [], "changed": ["blog/a.html"], "removed": ["blog/b.html"]}
+	assert not (tmp_path / "dist" / "blog" / "b.html").exists()
+
+	assert build([]) == {"added": [], "changed": [], "removed": ["blog/a.html"]}
+	assert not (tmp_path / "dist" / "blog").exists()
+
+
+def test_targeted_build_session(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "index.jinja").write_text("{{ title }}")
+	(tmp_path / "public").mkdir()
+	(tmp_path / "public" / "style.css").write_text("p {}")
+	(tmp_path / "notes.txt").write_text("a")
+	ssg = SiteGenerator(str(tmp_path))
+
+	def build():
+		ssg.copy("public")
+		ssg.page("index.jinja", title=(tmp_path / "notes.txt").read_text())
+
+	with ssg.build_session():
+		build()
+
+	# nothing in public changed, so the copy is skipped but its outputs are kept
+	synced = []
+	monkeypatch.setattr(
+		"solstice.sitegen.sync_tree", lambda *args, **kwargs: synced.append(args) or (0, 0)
+	)
+	(tmp_path / "notes.txt").write_text("b")
+	with ssg.build_session(changed=["notes.txt"]) as changes:
+		build()
+	assert synced == []
+	assert changes == {"added": [], "changed": ["index.html"], "removed": []}
+	assert (tmp_path / "dist" / "public" / "style.css").exists()
+
+	with ssg.build_session(changed=["public/style.css"]):
+		build()
+	assert len(synced) == 1
+
+
+def test_targeted_session_skips_unaffected_pages(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "post.jinja").write_text("{{ title }}: {{ content | safe }}")
+	(tmp_path / "templates" / "list.jinja").write_text("{{ titles | join(', ') }}")
+	for name in ["a", "b"]:
+		(tmp_path / f"{name}.md").write_text(f"---\ntitle: {name}\n---\n{name}\n")
+	ssg = SiteGenerator(str(tmp_path))
+
+	def build():
+		pages = [MarkdownPage(ssg, "post.jinja", f"{name}.md", f"{name}.html") for name in "ab"]
+		ssg.build_pages(pages)
+		ssg.page("list.jinja", "index.html", titles=[page.meta["title"] for page in pages])
+
+	checked = []
+	fingerprint = ssg._page_fingerprint
+	monkeypatch.setattr(
+		ssg,
+		"_page_fingerprint",
+		lambda name, params: checked.append(name) or fingerprint(name, params),
+	)
+
+	def targeted(*changed):
+		checked.clear()
+		with ssg.build_session(changed=changed) as changes:
+			build()
+		return changes["changed"]
+
+	with ssg.build_session():
+		build()
+
+	# a new body only ends up in the page built from it; the other pages aren't even checked
+	(tmp_path / "a.md").write_text("---\ntitle: a\n---\nedited\n")
+	assert targeted("a.md") == ["a.html"]
+	assert checked == ["post.jinja"]
+
+	(tmp_path / "templates" / "list.jinja").write_text("{{ titles | join(' / ') }}")
+	assert targeted("templates/list.jinja") == ["index.html"]
+	assert checked == ["list.jinja"]
+
+	# a new title may show up anywhere, so every page is checked
+	(tmp_path / "b.md").write_text("---\ntitle: c\n---\nb\n")
+	assert targeted("b.md") == ["b.html", "index.html"]
+	assert sorted(checked) == ["list.jinja", "post.jinja", "post.jinja"]
+
+
+def test_precompressed_copies_follow_their_originals(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "public").mkdir()
+	css = "".join(f".rule-{i} {{ margin: {i}px; }}\n" for i in range(50))
+	for name in ["style.css", "zz.css"]:
+		(tmp_path / "public" / name).write_text(css)
+	public = tmp_path / "dist" / "public"
+
+	def build(profile):
+		ssg = SiteGenerator(str(tmp_path), profile=profile)
+		with ssg.build_session() as changes:
+			ssg.copy("public", fingerprint=True)
+		return changes
+
+	assert "public/style.css.gz" in build("prod")["added"]
+	mtime = (public / "style.css.gz").stat().st_mtime_ns
+	# unchanged copies aren't compressed again
+	assert build("prod") == {"added": [], "changed": [], "removed": []}
+	assert (public / "style.css.gz").stat().st_mtime_ns == mtime
+
+	# dev builds don't ship the (minified) precompressed copies of the last release build
+	assert "public/style.css.gz" in build("dev")["removed"]
+	assert not list(public.glob("*.gz"))
+
+	build("prod")
+	(tmp_path / "public" / "zz.css").unlink()
+	changes = build("prod")
+	assert "public/zz.css.gz" in changes["removed"]
+	assert not list(public.glob("zz*"))
+	assert (public / "style.css.gz").exists()
+
+
+def test_release_build_precompresses_outputs(tmp_path, monkeypatch):
+	import gzip
+
+	import brotli
+	import zstandard
+
+	from solstice.compress import negotiate
+
+	monkeypatch.chdir(tmp_path)
+	ssg = SiteGenerator(str(tmp_path), profile="prod")
+	html = "<p>" + "hello world " * 100 + "</p>"
+
+	with ssg.build_session() as changes:
+		ssg.write_output("index.html", html)
+		ssg.write_output("tiny.html", "<p>hi</p>")
+		ssg.write_output("image.bin", html)
+	assert "index.html.gz" in changes["added"]
+	assert not any(name.startswith(("tiny.html.", "image.bin.")) for name in changes["added"])
+	compressed = tmp_path / "dist" / "index.html.gz"
+	assert gzip.decompress(compressed.read_bytes()).decode() == html
+	assert brotli.decompress((tmp_path / "dist" / "index.html.br").read_bytes()).decode() == html
+	zst = (tmp_path / "dist" / "index.html.zst").read_bytes()
+	assert zstandard.decompress(zst).decode() == html
+
+	# unchanged outputs keep their precompressed files untouched
+	mtime = compressed.stat().st_mtime_ns
+	with ssg.build_session() as changes:
+		ssg.write_output("index.html", html)
+	assert changes == {"added": [], "changed": [], "removed": ["image.bin", "tiny.html"]}
+	assert compressed.stat().st_mtime_ns == mtime
+
+	with ssg.build_session() as changes:
+		pass
+	assert "index.html.gz" in changes["removed"]
+	assert not compressed.exists()
+
+	assert negotiate("gzip, deflate, br;q=0", ["br", "zstd", "gzip"]) == "gzip"
+	assert negotiate("*", ["br", "gzip"]) == "br"
+	assert negotiate("identity", ["gzip"]) is None
+
+
+def test_output_backends(tmp_path, monkeypatch):
+	import tarfile
+	import zipfile
+
+	from solstice.outputs import ArchiveOutput, OutputBackend
+
+	class Recorder(OutputBackend):
+		def __init__(self):
+			self.published = []
+
+		def publish(self, gen, manifest):
+			self.published.append(sorted(manifest))
+
+	with pytest.raises(TypeError):
+		OutputBackend()
+
+	monkeypatch.chdir(tmp_path)
+	recorder = Recorder()
+	ssg = SiteGenerator(str(tmp_path), output_backend=recorder)
+
+	with ssg.build_session():
+		ssg.write_output("index.html", "<p>one</p>")
+		ssg.write_output("blog/post.html", "<p>post</p>")
+	with ssg.build_session():
+		ssg.write_output("index.html", "<p>two</p>")
+	assert recorder.published == [["blog/post.html", "index.html"], ["index.html"]]
+
+	# outputs of a failed build are never published
+	with pytest.raises(RuntimeError), ssg.build_session():
+		ssg.write_output("index.html", "<p>three</p>")
+		raise RuntimeError
+	assert len(recorder.published) == 2
+
+	for name in ["site.tar.gz", "site.zip"]:
+		ssg.output_backend = ArchiveOutput(str(tmp_path / "out" / name))
+		with ssg.build_session():
+			ssg.write_output("index.html", "<p>two</p>")
+			ssg.write_output("blog/post.html", "<p>post</p>")
+	with tarfile.open(tmp_path / "out" / "site.tar.gz") as archive:
+		assert archive.getnames() == ["blog", "blog/post.html", "index.html"]
+		assert archive.getmember("blog").isdir()
+		assert archive.getmember("index.html").mode == os.stat("dist/index.html").st_mode & 0o7777
+		assert archive.extractfile("index.html").read() == b"<p>two</p>"
+	with zipfile.ZipFile(tmp_path / "out" / "site.zip") as archive:
+		assert archive.namelist() == ["blog/", "blog/post.html", "index.html"]
+		assert archive.read("blog/post.html") == b"<p>post</p>"
+
+
+def test_live_reload():
+	from solstice.livereload import LiveReload, inject_client
+
+	live = LiveReload()
+	start = live.event_id()
+	assert live.wait(start, timeout=0) is None
+	assert b'"' + start.encode() + b'"' in inject_client(b"<body><p>hi</p></BODY>", start)
+	assert inject_client(b"<p>hi</p>", start).startswith(b'<p>hi</p><script id="solstice-live">')
+
+	live.notify({"added": ["a.html"], "changed": [], "removed": []})
+	after_one = live.event_id()
+	live.notify({"added": [], "changed": ["style.css"], "removed": ["b.html"]})
+	assert live.wait(start, timeout=0) == (live.event_id(), ["a.html", "b.html", "style.css"])
+	assert live.wait(after_one, timeout=0) == (live.event_id(), ["b.html", "style.css"])
+	# ids from another server process (e.g. after a full reload) can't tell what changed
+	assert live.wait("0000:1", timeout=0) == (live.event_id(), None)
+
+
+def test_live_reload_style_change_keeps_body(tmp_path, monkeypatch):
+	from solstice.livereload import CLIENT_ID, CLIENT_SCRIPT, LiveReload, inject_client
+
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "page.jinja").write_text(
+		"<body><link rel='stylesheet' href='/public/style.css' /><p class='a'>hi</p></body>"
+	)
+	(tmp_path / "public").mkdir()
+	live = LiveReload()
+	ssg = SiteGenerator(str(tmp_path))
+
+	def build(css: str) -> str:
+		(tmp_path / "public" / "style.css").write_text(css)
+		with ssg.build_session() as changes:
+			ssg.copy("public")
+			ssg.page("page.jinja", "index.html")
+			ssg.bundle_css()
+		live.notify(changes)
+		html = (tmp_path / "dist" / "index.html").read_bytes()
+		return inject_client(html, live.event_id()).decode()
+
+	def strip(html: str) -> str:
+		# what the client compares: the body without stylesheets and without the client itself
+		body = re.search(r"<body>(.*)</body>", html, re.S).group(1)
+		body = re.sub(rf'<script id="{CLIENT_ID}">.*?</script>', "", body, flags=re.S)
+		return re.sub(r"<link [^>]*>|<style>.*?</style>", "", body, flags=re.S)
+
+	before, after = build(".a { color: red; }"), build(".a { color: blue; }")
+	assert before != after
+	assert strip(before) == strip(after)
+	assert "strip(page.body) !== initial" in CLIENT_SCRIPT
+
+
+def test_http_server_revalidates_with_etags(tmp_path, monkeypatch):
+	import http.client
+	import threading
+	import time
+
+	from solstice import cli
+	from solstice.livereload import CLIENT_ID, LiveReload
+
+	monkeypatch.setattr(cli, "_http_server", None)
+	write_if_changed(str(tmp_path / "index.html"), "<p>one</p>")
+	write_if_changed(str(tmp_path / "data.txt"), "one")
+	args = (0, str(tmp_path), LiveReload())
+	threading.Thread(target=cli.run_http_server, args=args, daemon=True).start()
+	for _ in range(100):
+		if cli._http_server is not None:
+			break
+		time.sleep(0.05)
+	server = cli._http_server
+	assert server is not None
+	try:
+		conn = http.client.HTTPConnection("localhost", server.server_address[1], timeout=5)
+
+		def get(url: str, **headers: str) -> http.client.HTTPResponse:
+			conn.request("GET", url, headers=headers)
+			response = conn.getresponse()
+			response.body = response.read()
+			return response
+
+		response = get("/")
+		assert response.status == 200 and response.getheader("Cache-Control") == "no-cache"
+		# pages get the live reload client
+		assert f'<script id="{CLIENT_ID}">' in response.body.decode()
+		etag = response.getheader("ETag")
+		assert etag.startswith('"') and not response.will_close
+		# the second request reuses the connection
+		sock = conn.sock
+		assert get("/index.html", **{"If-None-Match": etag}).status == 304
+		assert conn.sock is sock
+
+		assert get("/", **{"If-None-Match": f"W/{etag}"}).status == 304
+		assert get("/", **{"If-None-Match": f'"other", {etag}'}).status == 304
+		assert get("/", **{"If-None-Match": "*"}).status == 304
+		assert get("/", **{"If-None-Match": '"other"'}).status == 200
+
+		write_if_changed(str(tmp_path / "index.html"), "<p>two</p>")
+		response = get("/", **{"If-None-Match": etag})
+		assert response.status == 200 and response.getheader("ETag") != etag
+
+		etag = get("/data.txt").getheader("ETag")
+		assert get("/data.txt", **{"If-None-Match": etag}).status == 304
+		conn.close()
+	finally:
+		server.shutdown()
+
+
+def test_build_pages_parallel(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "post.jinja").write_text("{{ title }}|{{ content | safe }}|{{ n }}")
+	for i in range(4):
+		(tmp_path / f"{i}.md").write_text(f"---\ntitle: Post {i}\n---\n*{i}*\n")
+
+	ssg = SiteGenerator(str(tmp_path), jobs=2)
+	ssg._PARALLEL_MIN_BATCH = 1
+	paths = [f"{i}.md" for i in range(4)]
+
+	metas = [meta for _, _, meta in ssg.load_md_many(paths)]
+	assert [meta["title"] for meta in metas] == [f"Post {i}" for i in range(4)]
+
+	pages = [
+		MarkdownPage(ssg, "post.jinja", p, f"{i}.html").set_params(n=i) for i, p in enumerate(paths)
+	]
+	ssg.build_pages(pages)
+
+	for i in range(4):
+		assert (tmp_path / "dist" / f"{i}.html").read_text() == f"Post {i}|<p><em>{i}</em></p>|{i}"
+	assert ssg.pages_affected_by(["post.jinja"]) == {f"{i}.html" for i in range(4)}
+
+	# workers don't outlive the generator, e.g. when hot reloading replaces it
+	workers = list(ssg._executor._processes.values())
+	ssg.close()
+	assert workers and not any(worker.is_alive() for worker in workers)
+	assert ssg._executor is None
+
+
+def test_trace_includes_worker_spans(tmp_path, monkeypatch):
+	import importlib
+
+	# `solstice.log` is shadowed by the `log()` function
+	log = importlib.import_module("solstice.log")
+
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "post.jinja").write_text("{{ content | safe }}")
+	for i in range(2):
+		(tmp_path / f"{i}.md").write_text(f"*{i}*\n")
+
+	ssg = SiteGenerator(str(tmp_path), jobs=2)
+	ssg._PARALLEL_MIN_BATCH = 1
+	monkeypatch.setattr(log, "_trace", None)
+	log.start_trace()
+	with log.span("build"):
+		ssg.build_pages(MarkdownPage(ssg, "post.jinja", f"{i}.md", f"{i}.html") for i in range(2))
+	log.write_trace(str(tmp_path / "trace.json"))
+
+	events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+	spans = [e for e in events if e["ph"] == "X"]
+	(build,) = [e for e in spans if e["name"] == "build"]
+	pages = [e for e in spans if e["name"] == "page"]
+	assert sorted(e["args"]["output"] for e in pages) == ["0.html", "1.html"]
+	assert all(e["pid"] != os.getpid() for e in pages)
+	assert {"load_md", "markdown", "render", "write"} <= {e["name"] for e in spans}
+	# worker spans fall within the span of the main process they were started from
+	assert all(build["ts"] <= e["ts"] <= build["ts"] + build["dur"] for e in pages)
+
+
+def test_sync_tree(tmp_path):
+	src, dst = tmp_path / "src", tmp_path / "dst"
+	(src / "css").mkdir(parents=True)
+	(src / "css" / "a.css").write_text("a")
+	(src / "b.txt").write_text("b")
+
+	assert sync_tree(str(src), str(dst)) == (2, 0)
+	assert (dst / "css" / "a.css").read_text() == "a"
+	assert sync_tree(str(src), str(dst)) == (0, 0)
+
+	(src / "b.txt").write_text("bb")
+	(src / "css" / "a.css").unlink()
+	assert sync_tree(str(src), str(dst)) == (1, 1)
+	assert (dst / "b.txt").read_text() == "bb"
+	assert not (dst / "css" / "a.css").exists()
+
+	linked = tmp_path / "linked"
+	assert sync_tree(str(src), str(linked), mode="hardlink") == (1, 0)
+	assert (linked / "b.txt").stat().st_ino == (src / "b.txt").stat().st_ino
+
+	# same size and mtime but different contents is only caught with checksum=True
+	stat = (dst / "b.txt").stat()
+	(dst / "b.txt").write_text("xx")
+	os.utime(dst / "b.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+	assert sync_tree(str(src), str(dst)) == (0, 0)
+	assert sync_tree(str(src), str(dst), checksum=True) == (1, 0)
+	assert (dst / "b.txt").read_text() == "bb"
+
+
+def test_write_if_changed(tmp_path):
+	dest = tmp_path / "out.html"
+	assert write_if_changed(str(dest), "héllo")
+	os.utime(dest, ns=(0, 0))
+
+	assert not write_if_changed(str(dest), "héllo")
+	assert dest.stat().st_mtime_ns == 0
+
+	assert write_if_changed(str(dest), b"bye")
+	assert dest.read_bytes() == b"bye"
+	assert os.listdir(tmp_path) == ["out.html"]
+
+
+def test_write_chunks_if_changed(tmp_path):
+	dest = tmp_path / "out.html"
+	chunks = ["<p>", "héllo" * 1000, "</p>"]
+	assert write_chunks_if_changed(str(dest), iter(chunks), buffer_size=64)
+	assert dest.read_text() == "".join(chunks)
+	os.utime(dest, ns=(0, 0))
+
+	assert not write_chunks_if_changed(str(dest), iter(chunks))
+	assert dest.stat().st_mtime_ns == 0
+	assert write_chunks_if_changed(str(dest), [b"bye"])
+	assert os.listdir(tmp_path) == ["out.html"]
+
+
+def test_streamed_pages(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "base.jinja").write_text("<ul>{% block items %}{% endblock %}</ul>")
+	(tmp_path / "templates" / "list.jinja").write_text(
+		'{% extends "base.jinja" %}'
+		"{% block items %}{% for i in items %}<li>{{ i }}</li>{% endfor %}{% endblock %}"
+	)
+	items = list(range(10000))
+
+	SiteGenerator(str(tmp_path), output_path="whole").page("list.jinja", items=items)
+	streamed = SiteGenerator(str(tmp_path), output_path="streamed", stream_pages=True)
+	streamed.page("list.jinja", items=items)
+
+	assert (tmp_path / "streamed/list.html").read_text() == (
+		tmp_path / "whole/list.html"
+	).read_text()
+	assert streamed.template_dependencies("list.html") == {"list.jinja", "base.jinja"}
+
+
+def test_prod_profile_minifies(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "a.jinja").write_text(
+		"<html>\n  <head>\n    <style>\n      p  { color : red ; }\n    </style>\n  </head>\n"
+		"  <body>\n    <p>  hi  </p>\n  </body>\n</html>\n"
+	)
+	(tmp_path / "public").mkdir()
+	(tmp_path / "public" / "a.css").write_text("a  {\n  color : blue ;\n}\n")
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.set_profile("prod")
+	ssg.page("a.jinja")
+	ssg.copy("public")
+
+	assert (
+		tmp_path / "dist" / "a.html"
+	).read_text() == "<html><head><style>p{color:red}</style><body><p>hi"
+	assert (tmp_path / "dist" / "public" / "a.css").read_text() == "a{color:#00f}"
+
+
+def test_asset_fingerprinting(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "a.jinja").write_text("{{ asset('public/css/a.css') }}")
+	css = tmp_path / "public" / "css"
+	css.mkdir(parents=True)
+	(css / "a.css").write_text('@import "./b.css";\nbody { background: url("../img/x.png"); }')
+	(css / "b.css").write_text("p { color: red; }")
+	(tmp_path / "public" / "img").mkdir()
+	(tmp_path / "public" / "img" / "x.png").write_bytes(b"png")
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.copy("public", fingerprint=True)
+	ssg.page("a.jinja")
+
+	dist = tmp_path / "dist"
+	manifest = json.loads((dist / "asset-manifest.json").read_text())
+	hashed_a, hashed_b, hashed_x = (
+		manifest[f"public/{name}"] for name in ("css/a.css", "css/b.css", "img/x.png")
+	)
+	assert re.fullmatch(r"public/css/a\.[0-9a-f]{8}\.css", hashed_a)
+	assert (dist / "a.html").read_text() == "/" + hashed_a
+	assert ssg.asset("css/b.css") == "/" + hashed_b
+	rewritten = (dist / hashed_a).read_text()
+	assert f'@import "./{hashed_b.split("/")[-1]}"' in rewritten
+	assert f'url("../img/{hashed_x.split("/")[-1]}")' in rewritten
+
+	# changing an imported stylesheet changes the importer's hash too, and the page is re-rendered
+	(css / "b.css").write_text("p { color: blue; }")
+	ssg.copy("public", fingerprint=True)
+	ssg.page("a.jinja")
+	assert ssg.asset("public/css/a.css") != "/" + hashed_a
+	assert (dist / "a.html").read_text() == ssg.asset("public/css/a.css")
+	assert not (dist / hashed_a).exists()
+	assert (dist / hashed_x).exists()
+
+
+def test_bundle_css(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "page.jinja").write_text(
+		'<link rel="stylesheet" href="/public/css/a.css" />'
+		'<link rel="stylesheet" href="/public/css/c.css" />'
+		'<p class="{{ cls }}"></p>'
+	)
+	css = tmp_path / "public" / "css"
+	css.mkdir(parents=True)
+	(css / "a.css").write_text(
+		'@import "./b.css";\n.used { color: red; } .unused, p { margin: 0; }'
+	)
+	(css / "b.css").write_text(
+		"@font-face { src: url('../font.woff2'); }\n.x { & .y { color: blue; } }\n"
+		"@media (width < 600px) { .gone { color: red; } }"
+	)
+	(css / "c.css").write_text(".runtime { color: green; } .other { color: green; }")
+
+	ssg = SiteGenerator(str(tmp_path))
+
+	def build(**kwargs):
+		with ssg.build_session():
+			ssg.copy("public")
+			ssg.page("page.jinja", "one.html", cls="used")
+			ssg.page("page.jinja", "two.html", cls="x y")
+			ssg.bundle_css(keep=["runtime"], **kwargs)
+
+	build()
+	dist = tmp_path / "dist"
+	one, two = (dist / "one.html").read_text(), (dist / "two.html").read_text()
+	assert one.startswith('<link rel="stylesheet" href="/_css/bundle.') and one.count("<link") == 1
+	assert one.split("<p")[0] == two.split("<p")[0]
+	bundle = (dist / one.split('"')[3].lstrip("/")).read_text()
+	assert bundle == (
+		"@font-face{src: url('/public/font.woff2');}"
+		".x{& .y{color: blue;}}.used{color: red;}p{margin: 0;}.runtime{color: green;}"
+	)
+
+	# bundled pages that are skipped as up to date still know their stylesheets
+	build()
+	assert (dist / "one.html").read_text() == one
+	build(inline_limit=1000)
+	assert (dist / "one.html").read_text().startswith(f"<style>{bundle}</style><p")
+	assert not list((dist / "_css").glob("*.css"))
+
+
+def test_icon_sprite(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	icons = tmp_path / "templates" / "icon"
+	(icons / "brands").mkdir(parents=True)
+	(icons / "brands" / "github.svg").write_text(
+		'<svg xmlns="http://www.w3.org/2000/svg" width="24" class="icon" viewBox="0 0 24 24"'
+		' fill="none"><!-- license --><path d="M0 0h24" /></svg>'
+	)
+	(tmp_path / "templates" / "page.jinja").write_text('{{ icon("brands/github", class="big") }}')
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.icons("templates/icon")
+	ssg.page("page.jinja", "index.html")
+
+	dist = tmp_path / "dist"
+	(sprite,) = (dist / "_icons").glob("icon.*.svg")
+	assert sprite.read_text() == (
+		'<svg xmlns="http://www.w3.org/2000/svg"><symbol id="brands-github" viewBox="0 0 24 24"'
+		' fill="none"><!-- license --><path d="M0 0h24" /></symbol></svg>\n'
+	)
+	assert (dist / "index.html").read_text() == (
+		'<svg xmlns="http://www.w3.org/2000/svg" width="24" class="big" viewBox="0 0 24 24">'
+		f'<use href="/_icons/{sprite.name}#brands-github" /></svg>'
+	)
+
+	# pages are rebuilt when the sprite changes
+	(icons / "brands" / "github.svg").write_text('<svg viewBox="0 0 16 16"><path d="M0 0" /></svg>')
+	ssg.icons("templates/icon")
+	ssg.page("page.jinja", "index.html")
+	assert ssg.asset("_icons/icon.svg") != f"/_icons/{sprite.name}"
+	assert ssg.asset("_icons/icon.svg") in (dist / "index.html").read_text()
+
+	with pytest.raises(KeyError):
+		ssg.icon("missing")
+
+
+def test_responsive_images(tmp_path, monkeypatch):
+	Image = pytest.importorskip("PIL.Image")
+	from solstice import images
+
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "img").mkdir()
+	Image.new("RGB", (1000, 500), "red").save(tmp_path / "img" / "cat.png")
+
+	ssg = SiteGenerator(str(tmp_path))
+	ssg.images("img", widths=[400, 2000], formats=["webp"])
+	html = ssg.responsive_images('<p><img alt="cat" src="/img/cat.png" /><img src="/x.png" /></p>')
+	urls = re.findall(r"(/_img/img/cat\.\d+w\.\w+\.webp) (\d+)w", html)
+	assert [int(width) for _, width in urls] == [400, 1000]
+	assert Image.open(tmp_path / "dist" / urls[0][0].lstrip("/")).size == (400, 200)
+	assert html.endswith(
+		'<img alt="cat" src="/img/cat.png" loading="lazy" /></picture><img src="/x.png" /></p>'
+	)
+	assert 'sizes="100vw"' in html
+
+	# the slot is the layout's, not the image's: it doesn't depend on how large the image is
+	ssg.images("img", widths=[400, 2000], formats=["webp"], sizes="(max-width: 800px) 100vw, 50rem")
+	html = ssg.responsive_images('<img src="/img/cat.png" />')
+	assert 'sizes="(max-width: 800px) 100vw, 50rem"' in html
+	assert 'sizes="20rem"' in ssg.responsive_images('<img src="/img/cat.png" />', sizes="20rem")
+
+	# variants come from the cache, even when the output is gone
+	shutil.rmtree(tmp_path / "dist")
+	monkeypatch.setattr(images, "_encode", lambda *_: pytest.fail("image was encoded again"))
+	SiteGenerator(str(tmp_path)).images("img", widths=[400, 2000], formats=["webp"])
+	assert (tmp_path / "dist" / urls[1][0].lstrip("/")).exists()
+
+
+def test_subset_fonts(tmp_path, monkeypatch):
+	pytest.importorskip("brotli")
+	pytest.importorskip("fontTools.subset")
+	from fontTools.fontBuilder import FontBuilder
+	from fontTools.pens.ttGlyphPen import TTGlyphPen
+	from fontTools.ttLib import TTFont
+
+	monkeypatch.chdir(tmp_path)
+	chars = "abcxyz"
+	builder = FontBuilder(1000, isTTF=True)
+	builder.setupGlyphOrder([".notdef", *chars])
+	builder.setupCharacterMap({ord(c): c for c in chars})
+	pen = TTGlyphPen(None)
+	pen.moveTo((0, 0))
+	pen.lineTo((0, 500))
+	pen.lineTo((500, 0))
+	pen.closePath()
+	builder.setupGlyf({name: pen.glyph() for name in [".notdef", *chars]})
+	builder.setupHorizontalMetrics({name: (500, 0) for name in [".notdef", *chars]})
+	builder.setupHorizontalHeader()
+	builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+	builder.setupOS2()
+	builder.setupPost()
+	(tmp_path / "public").mkdir()
+	builder.save(str(tmp_path / "public" / "test.ttf"))
+	(tmp_path / "public" / "font.css").write_text(
+		'@font-face { src: url("test.ttf") format("truetype"); }\np::before { content: "\\7a"; }'
+	)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "page.jinja").write_text("<p title='c'>a &amp; b</p>")
+	(tmp_path / "art.asc").write_text("x")
+
+	ssg = SiteGenerator(str(tmp_path))
+	with ssg.build_session():
+		ssg.copy("public")
+		ssg.page("page.jinja", "index.html")
+		ssg.subset_fonts(text_files=["art.asc"])
+
+	css = (tmp_path / "dist" / "public" / "font.css").read_text()
+	subset = re.search(r'url\("/(_fonts/test\.[0-9a-f]{8}\.woff2)"\) format\("woff2"\)', css)
+	assert subset is not None
+	font = TTFont(tmp_path / "dist" / subset.group(1))
+	# the page text, the generated content and the text file; not the attribute
+	assert sorted(chr(c) for c in font.getBestCmap()) == ["a", "b", "x", "z"]
+
+	# fingerprinted stylesheets are never changed in place, but replaced by a new copy
+	(tmp_path / "templates" / "page.jinja").write_text(
+		"<link rel='stylesheet' href='{{ asset(\"public/font.css\") }}'><p>a</p>"
+	)
+
+	def build(profile="dev"):
+		ssg = SiteGenerator(str(tmp_path), profile=profile)
+		with ssg.build_session() as changes:
+			ssg.copy("public", fingerprint=True)
+			ssg.page("page.jinja", "index.html")
+			ssg.subset_fonts()
+		return ssg, changes
+
+	ssg, _ = build()
+	hashed = ssg.asset("public/font.css")
+	contents = (tmp_path / "dist" / hashed.lstrip("/")).read_text()
+	assert '"/_fonts/test.' in contents
+	assert hashed == "/" + fingerprinted_name("public/font.css", digest(contents))
+	assert hashed in (tmp_path / "dist" / "index.html").read_text()
+	manifest = json.loads((tmp_path / "dist" / "asset-manifest.json").read_text())
+	assert manifest["public/font.css"] == hashed.lstrip("/")
+	assert len(list((tmp_path / "dist" / "public").glob("font.*.css"))) == 1
+
+	# the rewritten stylesheets aren't copied and rewritten again while their sources don't change
+	unchanged = {"added": [], "changed": [], "removed": []}
+	for profile in ["dev", "prod"]:
+		build(profile)
+		mtimes = {file: file.stat().st_mtime_ns for file in (tmp_path / "dist").rglob("*.css")}
+		assert build(profile)[1] == unchanged
+		assert {file: file.stat().st_mtime_ns for file in mtimes} == mtimes
+
+
+def test_jinja_bytecode_cache(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / "templates").mkdir()
+	(tmp_path / "templates" / "a.jinja").write_text("{{ x }}")
+
+	SiteGenerator(str(tmp_path)).render("a.jinja", x=1)
+	(cache_dir,) = (tmp_path / ".solstice-cache").glob("jinja-*")
+	assert len(list(cache_dir.iterdir())) == 1
+
+	# a fresh generator picks up the compiled template, and still notices source changes
+	assert SiteGenerator(str(tmp_path)).render("a.jinja", x=1) == "1"
+	(tmp_path / "templates" / "a.jinja").write_text("{{ x }}!")
+	assert SiteGenerator(str(tmp_path)).render("a.jinja", x=1) == "1!"
+
+
+def test_bench(tmp_path):
+	from solstice import bench
+
+	bench.generate_corpus(str(tmp_path / "a"), posts=3, members=2, assets=2)
+	bench.generate_corpus(str(tmp_path / "b"), posts=3, members=2, assets=2)
+	assert (tmp_path / "a/blog/post2.md").read_text() == (tmp_path / "b/blog/post2.md").read_text()
+
+	results = bench.run_benchmark({"posts": 3, "members": 2, "assets": 2}, repeat=1, jobs=1)
+	assert set(results["scenarios"]) == {"cold", "warm", "edit"}
+	assert json.loads(json.dumps(results)) == results
+
+	slower = json.loads(json.dumps(results))
+	slower["scenarios"]["warm"]["median"] *= 2
+	assert bench.compare_results(results, results) == []
+	assert [line.split(":")[0] for line in bench.compare_results(slower, results)] == ["warm"]
+
+
+# modules that make `import solstice` slow; they should only be loaded once they're actually needed
+HEAVY_MODULES = [
+	"jinja2",
+	"markdown",
+	"pymdownx",
+	"l2m4m",
+	"frontmatter",
+	"pygments",
+	"yaml",
+	"PIL",
+	"fontTools",
+]
+
+# generous, so slow CI machines don't fail; a regression that pulls in markdown or jinja is caught above
+IMPORT_BUDGET_SECONDS = 0.3
+
+
+def test_import_time_budget(tmp_path):
+	script = """
+import sys, time
+start = time.perf_counter()
+import solstice
+elapsed = time.perf_counter() - start
+solstice.SiteGenerator(sys.argv[1]).clean()
+print(elapsed)
+print(" ".join(m for m in sys.modules if m.split(".")[0] in sys.argv[2:]))
+"""
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	result = subprocess.run(
+		[sys.executable, "-c", script, str(tmp_path), *HEAVY_MODULES],
+		cwd=root,
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+	elapsed, loaded = result.stdout.split("\n")[:2]
+	assert loaded == ""
+	assert float(elapsed) < IMPORT_BUDGET_SECONDS
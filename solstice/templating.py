@@ -0,0 +1,27 @@
+"""
+Jinja2 integration. Kept in its own module so `jinja2` is only imported once a template is rendered.
+"""
+
+import jinja2
+
+
+class TrackingEnvironment(jinja2.Environment):
+	"""
+	Jinja2 environment that remembers which templates were loaded while tracking is active.
+	Templates pulled in through `{% extends %}`, `{% import %}` and `{% include %}` are all loaded
+	through `get_template`/`select_template` at render time, so this also catches dynamic includes.
+	"""
+
+	_tracked: set[str] | None = None
+
+	def get_template(self, name, parent=None, globals=None):
+		template = super().get_template(name, parent, globals)
+		if self._tracked is not None and template.name is not None:
+			self._tracked.add(template.name)
+		return template
+
+	def select_template(self, names, parent=None, globals=None):
+		template = super().select_template(names, parent, globals)
+		if self._tracked is not None and template.name is not None:
+			self._tracked.add(template.name)
+		return template